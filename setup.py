@@ -13,6 +13,9 @@ setup(
         "emoji",
         "github-heatmap",
     ],
+    extras_require={
+        "fast": ["orjson"],
+    },
     entry_points={
         "console_scripts": [
             "toggl2notion = toggl2notion.toggl:main",
@@ -0,0 +1,36 @@
+import pendulum
+
+from toggl2notion.coverage import DayCoverage
+
+
+def test_counts_outside_range_are_ignored():
+    coverage = DayCoverage(pendulum.date(2024, 1, 1), pendulum.date(2024, 1, 10))
+    assert coverage.size == 10
+    assert coverage.add_toggl(pendulum.date(2023, 12, 31)) is None
+    assert coverage.add_notion(pendulum.date(2024, 1, 11)) is None
+    assert coverage.mismatched_days() == []
+
+
+def test_mismatch_bitmap_and_days():
+    coverage = DayCoverage(pendulum.date(2024, 1, 1), pendulum.date(2024, 1, 10))
+    coverage.add_toggl(pendulum.date(2024, 1, 1))
+    coverage.add_notion(pendulum.date(2024, 1, 1))
+    coverage.add_toggl(pendulum.date(2024, 1, 2))
+    coverage.add_notion(pendulum.date(2024, 1, 10))
+    assert coverage.mismatched_days() == [1, 9]
+    assert coverage.mismatch_bitmap() == bytearray([0b00000010, 0b00000010])
+
+
+def test_mismatched_ranges_merge_small_gaps_newest_first():
+    coverage = DayCoverage(pendulum.date(2024, 1, 1), pendulum.date(2024, 1, 31))
+    for day in (2, 3, 6, 20):
+        coverage.add_toggl(pendulum.date(2024, 1, day))
+    assert list(coverage.mismatched_ranges()) == [
+        (pendulum.date(2024, 1, 20), pendulum.date(2024, 1, 20)),
+        (pendulum.date(2024, 1, 6), pendulum.date(2024, 1, 6)),
+        (pendulum.date(2024, 1, 2), pendulum.date(2024, 1, 3)),
+    ]
+    assert list(coverage.mismatched_ranges(max_gap=2)) == [
+        (pendulum.date(2024, 1, 20), pendulum.date(2024, 1, 20)),
+        (pendulum.date(2024, 1, 2), pendulum.date(2024, 1, 6)),
+    ]
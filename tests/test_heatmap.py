@@ -0,0 +1,30 @@
+import pytest
+
+from toggl2notion.heatmap import extract_page_id
+
+PAGE_ID = "1f2e3d4c-5b6a-7980-a1b2-c3d4e5f60718"
+VIEW_ID = "aaaaaaaabbbbccccddddeeeeeeeeeeee"
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "1f2e3d4c5b6a7980a1b2c3d4e5f60718",
+        PAGE_ID,
+        PAGE_ID.upper(),
+        "https://www.notion.so/1f2e3d4c5b6a7980a1b2c3d4e5f60718",
+        "https://www.notion.so/Toggl-1f2e3d4c5b6a7980a1b2c3d4e5f60718",
+        "https://www.notion.so/workspace/Time-Log-2024-1f2e3d4c5b6a7980a1b2c3d4e5f60718/",
+        f"https://www.notion.so/workspace/Toggl-1f2e3d4c5b6a7980a1b2c3d4e5f60718?v={VIEW_ID}",
+        f"https://www.notion.so/Toggl-1f2e3d4c5b6a7980a1b2c3d4e5f60718?v={VIEW_ID}&pvs=4",
+        f"https://www.notion.so/Toggl-1f2e3d4c5b6a7980a1b2c3d4e5f60718#{VIEW_ID}",
+        f"https://example.notion.site/{PAGE_ID}?pvs=4",
+    ],
+)
+def test_extract_page_id(value):
+    assert extract_page_id(value) == PAGE_ID
+
+
+@pytest.mark.parametrize("value", [None, "", "https://www.notion.so/workspace/Toggl", f"?v={VIEW_ID}"])
+def test_extract_page_id_without_an_id(value):
+    assert extract_page_id(value) is None
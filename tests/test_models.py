@@ -0,0 +1,67 @@
+import pytest
+
+from toggl2notion.models import TimeEntry, parse_epoch
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-01-01T10:00:00Z", 1704103200),
+        ("2024-01-01T10:00:00+00:00", 1704103200),
+        ("2024-01-01T18:00:00+08:00", 1704103200),
+        ("2024-01-01T10:00:00", 1704103200),
+        ("2024-01-01T10:00:00.123Z", 1704103200),
+        (None, None),
+        ("", None),
+    ],
+)
+def test_parse_epoch(value, expected):
+    assert parse_epoch(value) == expected
+
+
+def test_from_track_running_and_deleted():
+    entry = TimeEntry.from_track(
+        {
+            "id": 7,
+            "description": "写代码",
+            "start": "2024-01-01T10:00:00Z",
+            "stop": None,
+            "tags": ["a", "b"],
+            "project_id": 5,
+            "server_deleted_at": "2024-01-02T00:00:00Z",
+        }
+    )
+    assert (entry.id, entry.start, entry.stop, entry.project_id) == (7, 1704103200, None, 5)
+    assert entry.tags == ("a", "b")
+    assert entry.deleted
+    assert entry.stop_or_now() >= entry.start
+
+
+def test_from_report_v2_uses_end():
+    entry = TimeEntry.from_report_v2(
+        {"id": 1, "description": "x", "start": "2024-01-01T10:00:00Z", "end": "2024-01-01T11:00:00Z", "pid": 3}
+    )
+    assert entry.stop - entry.start == 3600
+    assert entry.project_id == 3
+    assert not entry.deleted
+
+
+def test_from_report_v3_maps_tag_ids():
+    row = {"description": "x", "project_id": None, "tag_ids": [1, 2]}
+    time_entry = {"id": 9, "start": "2024-01-01T10:00:00Z", "stop": "2024-01-01T10:30:00Z"}
+    entry = TimeEntry.from_report_v3(row, time_entry, {1: "tag", 2: "other"})
+    assert entry.tags == ("tag", "other")
+    assert entry.project_id is None
+
+
+def test_strings_are_interned_and_slots_used():
+    description = "".join(["同", "一个描述"])
+    first = TimeEntry(1, description, 0)
+    second = TimeEntry(2, "".join(["同一", "个描述"]), 0)
+    assert first.description is second.description
+    assert not hasattr(first, "__dict__")
+
+
+def test_dedupe_key_falls_back_to_start_and_description():
+    assert TimeEntry(5, "x", 10).dedupe_key == 5
+    assert TimeEntry(None, "x", 10).dedupe_key == (10, "x")
@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("notionhub")
+
+from toggl2notion.discovery import DiscoveryCache  # noqa: E402
+from toggl2notion.notion_helper import DATA_SOURCE_KEYS, NotionHelper  # noqa: E402
+
+
+class FakeAPIError(Exception):
+    def __init__(self, message, code=None, status=None):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+def test_missing_objects_are_drift_only_for_data_source_calls():
+    error = FakeAPIError("Could not find page", code="object_not_found", status=404)
+    assert not NotionHelper.is_schema_error(error)
+    assert NotionHelper.is_schema_error(error, data_source_call=True)
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("指纹 is not a property that exists.", True),
+        ("Could not find data source with ID: x. Data source not found.", True),
+        ("Invalid select option, commas not allowed.", False),
+    ],
+)
+def test_validation_errors(message, expected):
+    assert NotionHelper.is_schema_error(FakeAPIError(message, code="validation_error")) is expected
+
+
+def cached_helper(tmp_path, data_sources):
+    cache = DiscoveryCache(str(tmp_path / "discovery.json"))
+    cache.save({"data_sources": data_sources, "time_props": {"Id": "number"}, "time_title": "标题"})
+    helper = NotionHelper.__new__(NotionHelper)
+    helper.discovery_cache = cache
+    helper.get_property_type = lambda data_source_id: ({"Id": "number"}, "标题")
+    return helper
+
+
+def test_discovery_with_a_missing_data_source_is_a_cache_miss(tmp_path):
+    data_sources = {key: f"{key.lower()}-id" for key in DATA_SOURCE_KEYS}
+    data_sources["CLIENT"] = None
+    assert cached_helper(tmp_path, data_sources).load_discovery() is False
+
+
+def test_complete_discovery_is_restored(tmp_path):
+    helper = cached_helper(tmp_path, {key: f"{key.lower()}-id" for key in DATA_SOURCE_KEYS})
+    assert helper.load_discovery() is True
+    assert helper.client_data_source_id == "client-id"
+
+
+class FakeDataSources:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+def fingerprint_helper(tmp_path):
+    helper = cached_helper(tmp_path, {})
+    helper.client = type("FakeClient", (), {"data_sources": FakeDataSources()})()
+    helper.governed = lambda func, data_source_call=False, **kwargs: func(**kwargs)
+    helper.time_data_source_id = "time-id"
+    helper.time_props = {"Id": "number"}
+    helper.fingerprint_checked = False
+    return helper
+
+
+def test_fingerprint_property_is_not_added_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("NOTION_FINGERPRINT_PROPERTY", raising=False)
+    helper = fingerprint_helper(tmp_path)
+    helper.ensure_fingerprint_property()
+    assert helper.client.data_sources.updates == []
+
+
+def test_fingerprint_property_is_added_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("NOTION_FINGERPRINT_PROPERTY", "1")
+    helper = fingerprint_helper(tmp_path)
+    helper.ensure_fingerprint_property()
+    helper.ensure_fingerprint_property()
+    assert [update["properties"] for update in helper.client.data_sources.updates] == [{"指纹": {"rich_text": {}}}]
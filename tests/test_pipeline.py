@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from toggl2notion.pipeline import RunBudget, WindowPolicy, prefetch
+
+
+def test_prefetch_yields_items_in_order():
+    assert list(prefetch(iter(range(20)), depth=3)) == list(range(20))
+
+
+def test_prefetch_reraises_producer_errors():
+    def produce():
+        yield 1
+        raise ValueError("boom")
+
+    consumer = prefetch(produce())
+    assert next(consumer) == 1
+    with pytest.raises(ValueError, match="boom"):
+        next(consumer)
+
+
+def test_prefetch_close_stops_producer():
+    produced = []
+    finished = threading.Event()
+
+    def produce():
+        try:
+            for i in range(1000):
+                produced.append(i)
+                yield i
+        finally:
+            finished.set()
+
+    consumer = prefetch(produce(), depth=1)
+    assert next(consumer) == 0
+    consumer.close()
+    assert finished.wait(2)
+    # Backpressure: the producer never ran far ahead of the consumer
+    assert len(produced) < 10
+
+
+def make_policy():
+    return WindowPolicy("test", initial_days=10, min_days=1, max_days=90, target_entries=100, limit_entries=400)
+
+
+def test_window_policy_grows_when_sparse():
+    policy = make_policy()
+    assert policy.observe(10, 0) == 20
+    assert policy.observe(60, 0) == 90
+
+
+def test_window_policy_aims_for_target_density():
+    policy = make_policy()
+    assert policy.observe(10, 200) == 5
+    # Growth is capped at 2x per step
+    assert policy.observe(10, 10) == 20
+
+
+def test_window_policy_halves_at_limit():
+    policy = make_policy()
+    assert policy.observe(10, 400) == 5
+    assert policy.observe(1, 1000) == 1
+
+
+class FakeGovernor:
+    def __init__(self, calls):
+        self.calls = calls
+
+
+def test_run_budget_unlimited():
+    budget = RunBudget()
+    assert not budget.limited
+    assert not budget.exhausted()
+
+
+def test_run_budget_call_cap():
+    governors = [FakeGovernor(3), FakeGovernor(4)]
+    budget = RunBudget(max_calls=8, governors=governors)
+    assert budget.limited
+    assert not budget.exhausted()
+    governors[0].calls += 1
+    assert budget.exhausted()
+    assert "8/8 calls" in budget.describe()
+
+
+def test_run_budget_time_cap_keeps_reserve():
+    budget = RunBudget(max_seconds=1000)
+    assert budget.reserve_seconds == 100
+    assert not budget.exhausted()
+    budget.started_at -= 901
+    assert budget.exhausted()
+    assert RunBudget(max_seconds=10000).reserve_seconds == 120
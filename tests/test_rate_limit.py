@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("notionhub.log")
+
+from toggl2notion import rate_limit  # noqa: E402
+from toggl2notion.rate_limit import RateGovernor, TokenBucket, parse_retry_after  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(rate_limit.time, "sleep", slept.append)
+    return slept
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after({"Retry-After": "3"}) == 3.0
+    assert parse_retry_after({"X-Toggl-Quota-Resets-In": "12"}) == 12.0
+    assert parse_retry_after({"Retry-After": "soon", "X-Toggl-Quota-Resets-In": "5"}) == 5.0
+    assert parse_retry_after({"Retry-After": "-1"}) == 0.0
+
+
+def test_token_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(rate=1000, capacity=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_backoff_delay_honours_retry_after_and_cap():
+    governor = RateGovernor("test", rate=1, max_delay=10)
+    assert 3 <= governor.backoff_delay(0, retry_after=3) <= 3.25
+    assert 10 <= governor.backoff_delay(0, retry_after=100) <= 10.25
+    for attempt in range(8):
+        assert 0 < governor.backoff_delay(attempt) <= 10
+
+
+def test_call_retries_then_returns_and_adapts_rate():
+    governor = RateGovernor("test", rate=100, min_rate=10, max_rate=200, max_retries=3)
+    outcomes = iter([429, 429, 200])
+
+    def classify(status):
+        return status == 429, 0.0 if status == 429 else None
+
+    assert governor.call(lambda: next(outcomes), classify) == 200
+    assert governor.calls == 3
+    assert governor.throttled == 2
+    # Halved twice (100 -> 50 -> 25) then one additive step of max_rate / 20
+    assert governor.rate == pytest.approx(35)
+
+
+def test_call_gives_up_after_max_retries():
+    governor = RateGovernor("test", rate=100, max_retries=2)
+    assert governor.call(lambda: 503, lambda status: (True, 0.0)) == 503
+    assert governor.calls == 3
+
+
+def test_call_reraises_non_retryable_exceptions():
+    governor = RateGovernor("test", rate=100)
+
+    def fail():
+        raise KeyError("x")
+
+    with pytest.raises(KeyError):
+        governor.call(fail, lambda outcome: (False, None))
+
+
+def test_rate_never_drops_below_min():
+    governor = RateGovernor("test", rate=1, min_rate=0.5, max_rate=1)
+    for _ in range(5):
+        governor.on_throttle()
+    assert governor.rate == 0.5
@@ -0,0 +1,80 @@
+import pytest
+
+from toggl2notion.state import StateStore, open_state_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+
+def test_entries_roundtrip_and_bounds(store):
+    assert store.is_empty()
+    assert store.bounds() == (None, None)
+    store.upsert_entry(1, "page-1", "fp1", 100, 200)
+    store.upsert_entry(2, "page-2", None, 300, None)
+    assert not store.is_empty()
+    assert store.get_entry(1) == (1, "page-1", "fp1", 100, 200)
+    assert sorted(store.iter_entries()) == [(1, "page-1", "fp1"), (2, "page-2", None)]
+    # A running entry (no stop) counts with its start
+    assert store.bounds() == (100, 300)
+    assert list(store.iter_entries_between(150, 400)) == [(2, "page-2", 300, None)]
+    store.delete_entry(1)
+    assert store.get_entry(1) is None
+
+
+def test_cursors(store):
+    assert store.get_cursor("since", "default") == "default"
+    store.set_cursor("since", 123)
+    assert store.get_cursor("since") == "123"
+    store.set_cursor("since", None)
+    assert store.get_cursor("since") is None
+
+
+def test_resume_point_walks_contiguous_complete_windows(store):
+    store.record_window("history", 901, 1000, 5, "complete")
+    store.record_window("history", 801, 900, 0, "complete")
+    store.record_window("history", 701, 800, 3, "incomplete")
+    store.record_window("history", 501, 600, 1, "complete")
+    # 701..800 is incomplete, so resuming starts at its top
+    assert store.resume_point("history", 1000) == 800
+    # Nothing journaled above 2000 yet
+    assert store.resume_point("history", 2000) == 2000
+    # Other journal kinds are independent
+    assert store.resume_point("other", 1000) == 1000
+
+
+def test_resume_point_redoes_window_after_it_completes(store):
+    store.record_window("history", 901, 1000, 5, "incomplete")
+    assert store.resume_point("history", 1000) == 1000
+    store.record_window("history", 901, 1000, 5, "complete")
+    assert store.resume_point("history", 1000) == 900
+
+
+def test_reverse_pending(store):
+    store.mark_reverse_pending([("a", None), ("b", None)])
+    store.mark_reverse_pending([("a", 42)])
+    assert store.load_reverse_pending() == {"a": 42, "b": None}
+    store.clear_reverse_pending(["a"])
+    assert store.load_reverse_pending() == {"b": None}
+
+
+def test_workspace_meta(store):
+    store.upsert_clients([(1, 10, "Client")])
+    store.upsert_projects([(2, 10, "Project", 1, 1)])
+    assert store.load_workspace_meta() == ([(1, 10, "Client")], [(2, 10, "Project", 1, 1)])
+
+
+def test_open_state_store_disabled_without_path(monkeypatch):
+    monkeypatch.delenv("TOGGL_STATE_DB", raising=False)
+    assert open_state_store() is None
+
+
+def test_open_state_store_creates_directory(tmp_path):
+    store = open_state_store(str(tmp_path / "nested" / "state.db"))
+    try:
+        assert store.is_empty()
+    finally:
+        store.close()
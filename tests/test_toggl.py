@@ -0,0 +1,436 @@
+import pendulum
+import pytest
+
+pytest.importorskip("notionhub")
+
+from toggl2notion import toggl  # noqa: E402
+from toggl2notion.coverage import DayCoverage  # noqa: E402
+from toggl2notion.state import StateStore  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.ok = 200 <= status_code < 300
+        self.data = data
+        self.text = "" if data is None else str(data)
+        self.headers = headers or {}
+
+
+class FakeGovernor:
+    calls = 0
+
+
+class FakeTogglClient:
+    """Answers requests from a routes dict of path -> response or callable(path, kwargs)."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.governor = FakeGovernor()
+        self.requests = []
+
+    def answer(self, method, path, kwargs):
+        self.requests.append((method, path, kwargs))
+        self.governor.calls += 1
+        for prefix, route in self.routes.items():
+            if path.startswith(prefix):
+                return route(path, kwargs) if callable(route) else route
+        raise AssertionError(f"unexpected request {method} {path}")
+
+    def get(self, path, **kwargs):
+        return self.answer("GET", path, kwargs)
+
+    def post(self, path, **kwargs):
+        return self.answer("POST", path, kwargs)
+
+    @staticmethod
+    def json(response):
+        return response.data
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class FakeNotionHelper:
+    client_data_source_id = "clients"
+    project_data_source_id = "projects"
+
+    def __init__(self):
+        self.time_page_index = {}
+        self.time_fingerprints = {}
+        self.relation_index = {}
+        self.missing_pages = []
+        self.queued = {}
+        self.archived = []
+        self.deleted_pages = set()
+        self.updated = []
+        self.created = []
+
+    def ensure_time_id_property(self):
+        pass
+
+    def flush_writes(self):
+        return set()
+
+    def archive_page(self, page_id):
+        self.archived.append(page_id)
+
+    def query_missing_toggl_id(self):
+        return self.missing_pages
+
+    def get_title_from_page(self, page):
+        return page["title"]
+
+    def get_relation_page(self, page, property_names):
+        return None
+
+    def queue_update(self, page_id, properties, icon=None):
+        self.queued.setdefault(page_id, {}).update(properties)
+
+    def prepare_calendar(self, dates, window=None):
+        pass
+
+    def take_pending(self, page_id, properties, icon=None):
+        return properties, icon
+
+    def update_page(self, page_id, properties, icon=None):
+        if page_id in self.deleted_pages:
+            raise FakeAPIError(404)
+        self.updated.append(page_id)
+        return {"id": page_id}
+
+    def create_page(self, parent, properties, icon=None):
+        self.created.append(properties)
+        return {"id": f"new-{len(self.created)}"}
+
+    def run_writes(self, jobs):
+        results = []
+        for job in jobs:
+            try:
+                results.append((job(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = StateStore(str(tmp_path / "state.db"))
+    monkeypatch.setattr(toggl, "state_store", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def notion(monkeypatch):
+    helper = FakeNotionHelper()
+    monkeypatch.setattr(toggl, "notion_helper", helper)
+    return helper
+
+
+def use_toggl(monkeypatch, routes):
+    client = FakeTogglClient(routes)
+    monkeypatch.setattr(toggl, "toggl_client", client)
+    return client
+
+
+@pytest.mark.parametrize("status_code", [401, 403, 500, 503])
+def test_track_failure_fails_the_window(monkeypatch, store, notion, status_code):
+    use_toggl(monkeypatch, {"/api/v9/me/time_entries": FakeResponse(status_code)})
+    end = pendulum.now("Asia/Shanghai")
+    start = end.subtract(days=3)
+
+    windows = list(toggl.fetch_windows(start, end, [1]))
+    assert [status for _, _, _, status in windows] == [toggl.WINDOW_FAILED]
+
+    assert toggl.sync_data_range(start, end, [1], journal="history") is False
+    assert store.resume_point("history", end.int_timestamp) == end.int_timestamp
+
+
+def use_reports_v3(monkeypatch, routes):
+    monkeypatch.setattr(toggl, "reports_api_version", "v3")
+    monkeypatch.setattr(toggl, "tag_cache", {})
+    return use_toggl(monkeypatch, routes)
+
+
+def search_rows(*rows):
+    return FakeResponse(200, list(rows))
+
+
+def test_tag_failure_fails_the_workspace_and_is_not_cached(monkeypatch):
+    use_reports_v3(monkeypatch, {"/api/v9/workspaces/1/tags": FakeResponse(500)})
+    end = pendulum.datetime(2020, 1, 10, tz="Asia/Shanghai")
+    failures = {}
+    with pytest.raises(toggl.TogglAPIError):
+        list(toggl.iter_historical_entries([1], end.subtract(days=9), end, failures))
+    assert failures == {1: 500}
+    assert toggl.tag_cache == {}
+
+
+def test_new_tags_reload_the_tag_names(monkeypatch):
+    tag_pages = iter([[{"id": 1, "name": "a"}], [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]])
+    row = {
+        "description": "x",
+        "tag_ids": [1, 2],
+        "time_entries": [{"id": 5, "start": "2020-01-05T10:00:00Z", "stop": "2020-01-05T11:00:00Z"}],
+    }
+    use_reports_v3(
+        monkeypatch,
+        {
+            "/api/v9/workspaces/1/tags": lambda path, kwargs: FakeResponse(200, next(tag_pages)),
+            "/reports/api/v3/": search_rows(row),
+        },
+    )
+    end = pendulum.datetime(2020, 1, 10, tz="Asia/Shanghai")
+    entries = list(toggl.iter_historical_entries([1], end.subtract(days=9), end))
+    assert [entry.tags for entry in entries] == [("a", "b")]
+
+
+def test_unknown_tag_ids_fail_the_workspace(monkeypatch):
+    row = {"description": "x", "tag_ids": [7], "time_entries": [{"id": 5, "start": "2020-01-05T10:00:00Z"}]}
+    use_reports_v3(
+        monkeypatch,
+        {"/api/v9/workspaces/1/tags": FakeResponse(200, []), "/reports/api/v3/": search_rows(row)},
+    )
+    end = pendulum.datetime(2020, 1, 10, tz="Asia/Shanghai")
+    failures = {}
+    with pytest.raises(toggl.TogglAPIError):
+        list(toggl.iter_historical_entries([1], end.subtract(days=9), end, failures))
+    assert list(failures) == [1]
+
+
+def stale_pages_setup(monkeypatch, current):
+    monkeypatch.setattr(toggl, "state_store", None)
+    use_toggl(monkeypatch, {"/api/v9/me/time_entries/current": current})
+    today = pendulum.now("Asia/Shanghai").date()
+    coverage = DayCoverage(today.subtract(days=2), today)
+    # Without a state store every page has an end time, running or not
+    pages = {
+        1: ("page-running", 0, 100),
+        2: ("page-deleted", 0, 100),
+        3: ("page-today", 2, 100),
+        4: ("page-kept", 0, 100),
+    }
+    return coverage, pages
+
+
+def test_stale_pages_skip_the_running_entry(monkeypatch, notion):
+    coverage, pages = stale_pages_setup(monkeypatch, FakeResponse(200, {"id": 1}))
+    toggl.archive_stale_pages(coverage, pages, toggl_ids={4}, mismatched=[0, 2])
+    assert notion.archived == ["page-deleted"]
+
+
+def test_stale_pages_are_kept_when_the_running_entry_is_unknown(monkeypatch, notion):
+    coverage, pages = stale_pages_setup(monkeypatch, FakeResponse(503))
+    toggl.archive_stale_pages(coverage, pages, toggl_ids={4}, mismatched=[0, 2])
+    assert notion.archived == []
+
+
+def test_payment_required_narrows_the_window_before_recording_the_limit(monkeypatch, store):
+    limit = pendulum.date(2020, 3, 15)
+
+    def search(path, kwargs):
+        if pendulum.parse(kwargs["json"]["start_date"]).date() < limit:
+            return FakeResponse(402)
+        return search_rows()
+
+    use_reports_v3(monkeypatch, {"/api/v9/workspaces/1/tags": FakeResponse(200, []), "/reports/api/v3/": search})
+    start = pendulum.datetime(2020, 1, 1, tz="Asia/Shanghai")
+    end = pendulum.datetime(2020, 6, 30, tz="Asia/Shanghai")
+
+    windows = list(toggl.fetch_windows(start, end, [1], force_reports_api=True))
+    assert windows[-1][3] == toggl.WINDOW_FAILED
+    assert all(status == toggl.WINDOW_DONE for _, _, _, status in windows[:-1])
+    assert windows[-2][0].date() == limit
+    floor = toggl.get_historical_floor().date()
+    assert limit <= floor <= limit.add(days=2)
+
+
+def notion_page(page_id, title, start, minutes=30):
+    end = pendulum.parse(start).add(minutes=minutes).to_iso8601_string()
+    return {"id": page_id, "title": title, "properties": {"时间": {"date": {"start": start, "end": end}}}}
+
+
+def reverse_sync_toggl(monkeypatch, existing=None, existing_status=200):
+    created = []
+
+    def create(path, kwargs):
+        created.append(kwargs["json"]["description"])
+        return FakeResponse(200, {"id": 1000 + len(created)})
+
+    return created, use_toggl(
+        monkeypatch,
+        {
+            "/api/v9/me/workspaces": FakeResponse(200, [{"id": 1}]),
+            "/api/v9/me/time_entries": FakeResponse(existing_status, existing or []),
+            "/api/v9/workspaces/1/time_entries": create,
+        },
+    )
+
+
+def recent_start(days_ago=1):
+    return pendulum.now("UTC").subtract(days=days_ago).start_of("hour").to_iso8601_string()
+
+
+def test_reverse_sync_creates_and_links_new_pages(monkeypatch, store, notion):
+    start = recent_start()
+    notion.missing_pages = [notion_page("page-1", "写代码", start)]
+    created, _ = reverse_sync_toggl(monkeypatch)
+
+    toggl.reverse_sync_notion_to_toggl()
+
+    assert created == ["写代码"]
+    assert notion.queued == {"page-1": {"Id": {"number": 1001}}}
+    assert notion.time_page_index == {1001: "page-1"}
+    assert store.get_entry(1001)[1] == "page-1"
+    assert store.load_reverse_pending() == {}
+
+
+def test_reverse_sync_reuses_ids_from_the_pending_journal(monkeypatch, store, notion):
+    notion.missing_pages = [notion_page("page-1", "写代码", recent_start())]
+    store.mark_reverse_pending([("page-1", 77)])
+    created, _ = reverse_sync_toggl(monkeypatch)
+
+    toggl.reverse_sync_notion_to_toggl()
+
+    assert created == []
+    assert notion.queued == {"page-1": {"Id": {"number": 77}}}
+    assert store.load_reverse_pending() == {}
+
+
+def test_reverse_sync_matches_uncertain_pages_against_toggl(monkeypatch, store, notion):
+    start = recent_start()
+    notion.missing_pages = [notion_page("page-1", "写代码", start)]
+    # A previous run crashed after creating the entry but before recording its id
+    store.mark_reverse_pending([("page-1", None)])
+    created, _ = reverse_sync_toggl(monkeypatch, existing=[{"id": 55, "description": "写代码", "start": start}])
+
+    toggl.reverse_sync_notion_to_toggl()
+
+    assert created == []
+    assert notion.queued == {"page-1": {"Id": {"number": 55}}}
+
+
+def test_reverse_sync_postpones_pages_it_cannot_check(monkeypatch, store, notion):
+    notion.missing_pages = [notion_page("page-1", "写代码", recent_start())]
+    store.mark_reverse_pending([("page-1", None)])
+    created, _ = reverse_sync_toggl(monkeypatch, existing_status=503)
+
+    toggl.reverse_sync_notion_to_toggl()
+
+    assert created == []
+    assert notion.queued == {}
+    assert store.load_reverse_pending() == {"page-1": None}
+
+
+def test_existing_entry_keys_are_loaded_in_range_limited_chunks(monkeypatch):
+    near = pendulum.now("UTC").subtract(days=2).start_of("hour")
+    far = near.subtract(days=200)
+    plans = [
+        {"page_id": "near", "start_ts": near.int_timestamp},
+        {"page_id": "far", "start_ts": far.int_timestamp},
+    ]
+    row = {
+        "description": "old",
+        "tag_ids": [],
+        "time_entries": [{"id": 2, "start": far.to_iso8601_string(), "stop": far.add(hours=1).to_iso8601_string()}],
+    }
+    client = use_reports_v3(
+        monkeypatch,
+        {
+            "/api/v9/me/time_entries": FakeResponse(200, [{"id": 1, "description": "new", "start": near.to_iso8601_string()}]),
+            "/api/v9/workspaces/1/tags": FakeResponse(200, []),
+            "/reports/api/v3/": search_rows(row),
+        },
+    )
+
+    existing, failed = toggl.load_existing_entry_keys(plans, [1])
+
+    assert existing == {(near.int_timestamp, "new"): 1, (far.int_timestamp, "old"): 2}
+    assert failed == set()
+    assert [path for _, path, _ in client.requests if "time_entries" in path] == [
+        "/reports/api/v3/workspace/1/search/time_entries",
+        "/api/v9/me/time_entries",
+    ]
+
+
+@pytest.fixture
+def writes(monkeypatch, notion):
+    monkeypatch.setattr(toggl, "process_entry", lambda task, fingerprint=None: ({}, {"Id": task.id}, None))
+    monkeypatch.setattr(toggl, "sync_stats", dict.fromkeys(toggl.sync_stats, 0))
+    return notion
+
+
+def time_entry(toggl_id=1, description="写代码"):
+    return toggl.TimeEntry(toggl_id, description, 1700000000, 1700001800)
+
+
+def test_unchanged_entries_are_skipped(monkeypatch, writes):
+    monkeypatch.setattr(toggl, "state_store", None)
+    entry = time_entry()
+    writes.time_page_index[1] = "page-1"
+    writes.time_fingerprints[1] = toggl.entry_fingerprint(entry)
+
+    assert toggl.write_entries([entry]) == 0
+    assert writes.updated == [] and writes.created == []
+    assert toggl.sync_stats["skipped"] == 1
+
+
+def test_changed_entries_are_updated(monkeypatch, writes):
+    monkeypatch.setattr(toggl, "state_store", None)
+    writes.time_page_index[1] = "page-1"
+    writes.time_fingerprints[1] = "stale"
+
+    assert toggl.write_entries([time_entry()]) == 0
+    assert writes.updated == ["page-1"]
+    assert writes.time_fingerprints[1] == toggl.entry_fingerprint(time_entry())
+
+
+def test_deleted_pages_are_recreated(writes, store):
+    store.upsert_entry(1, "page-1", "stale", 1700000000, 1700001800)
+    writes.time_page_index[1] = "page-1"
+    writes.deleted_pages.add("page-1")
+
+    assert toggl.write_entries([time_entry()]) == 0
+    assert writes.created == [{"Id": 1}]
+    assert writes.time_page_index[1] == "new-1"
+    assert store.get_entry(1)[1] == "new-1"
+    assert toggl.sync_stats["created"] == 1
+
+
+def test_other_write_errors_are_counted(monkeypatch, writes):
+    monkeypatch.setattr(toggl, "state_store", None)
+    writes.time_page_index[1] = "page-1"
+    writes.deleted_pages.add("page-1")
+
+    # Without a state store the index came from a fresh query, so the page is not recreated
+    assert toggl.write_entries([time_entry()]) == 1
+    assert writes.created == []
+
+
+@pytest.fixture
+def fresh_caches(monkeypatch):
+    for name in ("project_cache", "client_cache", "project_name_cache", "client_name_cache", "project_display", "client_display"):
+        monkeypatch.setattr(toggl, name, {})
+
+
+def test_created_clients_and_projects_are_cached_and_stored(monkeypatch, store, fresh_caches):
+    use_toggl(
+        monkeypatch,
+        {
+            "/api/v9/workspaces/1/clients": FakeResponse(200, {"id": 10, "name": "🏢Acme"}),
+            "/api/v9/workspaces/1/projects": FakeResponse(200, {"id": 20, "name": "📚Reading", "client_id": 10}),
+        },
+    )
+
+    assert toggl.create_toggl_client(1, "🏢Acme") == 10
+    assert toggl.create_toggl_project(1, "📚Reading", client_id=10) == 20
+
+    assert toggl.get_client_display(10)["name"] == "Acme"
+    assert toggl.get_project_display(20)["emoji"] == "📚"
+    assert toggl.create_toggl_client(1, "🏢acme ") == 10
+    assert toggl.create_toggl_project(1, "📚Reading") == 20
+    assert store.load_workspace_meta() == ([(10, 1, "🏢Acme")], [(20, 1, "📚Reading", 10, 1)])
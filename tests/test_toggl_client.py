@@ -0,0 +1,65 @@
+import pytest
+import requests
+
+pytest.importorskip("notionhub.log")
+
+from toggl2notion import rate_limit  # noqa: E402
+from toggl2notion.rate_limit import RateGovernor  # noqa: E402
+from toggl2notion.toggl_client import TogglClient  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda delay: None)
+
+
+def client_with(outcomes):
+    client = TogglClient("token", base_url="http://toggl.test")
+    client.session = FakeSession(outcomes)
+    # Pace fast enough that the token bucket never waits
+    client.governor = RateGovernor("Toggl", rate=1000)
+    return client
+
+
+def test_get_retries_server_errors():
+    client = client_with([FakeResponse(503), FakeResponse(200)])
+    assert client.get("/api/v9/me").status_code == 200
+    assert client.session.calls == 2
+
+
+def test_post_does_not_retry_server_errors_or_read_timeouts():
+    client = client_with([FakeResponse(503), FakeResponse(200)])
+    assert client.post("/api/v9/workspaces/1/time_entries").status_code == 503
+    client = client_with([requests.ReadTimeout(), FakeResponse(200)])
+    with pytest.raises(requests.ReadTimeout):
+        client.post("/api/v9/workspaces/1/time_entries")
+
+
+def test_post_retries_rate_limits():
+    client = client_with([FakeResponse(429), FakeResponse(200)])
+    assert client.post("/api/v9/workspaces/1/time_entries").status_code == 200
+
+
+def test_idempotent_post_retries_like_a_get():
+    client = client_with([requests.ReadTimeout(), FakeResponse(502), FakeResponse(200)])
+    assert client.post("/reports/api/v3/workspace/1/search/time_entries", idempotent=True).status_code == 200
+    assert client.session.calls == 3
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("notionhub")
+
+from toggl2notion.utils import split_emoji_from_string  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("🍎Apple", ("🍎", "Apple")),
+        ("📚 读书", ("📚", " 读书")),
+        ("👍🏽Yes", ("👍🏽", "Yes")),
+        ("👨‍👩‍👧Family", ("👨‍👩‍👧", "Family")),
+        ("🇨🇳中国", ("🇨🇳", "中国")),
+        ("1️⃣One", ("1️⃣", "One")),
+        ("❤️Love", ("❤️", "Love")),
+    ],
+)
+def test_leading_emoji_is_split_off(name, expected):
+    assert split_emoji_from_string(name) == expected
+
+
+@pytest.mark.parametrize("name", ["Work", "123 numbers", "#hash", "中文", "Work 🍎"])
+def test_names_without_leading_emoji_get_the_default(name):
+    assert split_emoji_from_string(name) == ("⏰", name)
+
+
+@pytest.mark.parametrize("name", ["", None])
+def test_empty_names(name):
+    assert split_emoji_from_string(name) == ("⏰", name)
@@ -1,2 +1,6 @@
 from notionhub.client import TAG_ICON_URL, USER_ICON_URL, BOOKMARK_ICON_URL
 
+
+# rich_text property on the Time data source holding entry fingerprints;
+# created on the first sync only when NOTION_FINGERPRINT_PROPERTY is set
+FINGERPRINT_PROPERTY = "指纹"
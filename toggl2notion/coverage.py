@@ -0,0 +1,63 @@
+from array import array
+
+
+class DayCoverage:
+    """Per-day entry counts on both sides of the sync over [first_day, last_day].
+
+    Toggl and Notion counts are kept in two flat arrays indexed by the day's
+    offset from first_day. Days whose counts differ are the holes (or stale
+    leftovers) a repair run has to revisit.
+    """
+
+    def __init__(self, first_day, last_day):
+        self.first_day = first_day
+        self.size = max(0, (last_day - first_day).days + 1)
+        self.toggl = array("I", [0]) * self.size
+        self.notion = array("I", [0]) * self.size
+
+    def offset(self, day):
+        """Index of day in the arrays, or None when it is outside the covered range."""
+        index = (day - self.first_day).days
+        return index if 0 <= index < self.size else None
+
+    def day(self, index):
+        return self.first_day.add(days=index)
+
+    def add_toggl(self, day):
+        index = self.offset(day)
+        if index is not None:
+            self.toggl[index] += 1
+        return index
+
+    def add_notion(self, day):
+        index = self.offset(day)
+        if index is not None:
+            self.notion[index] += 1
+        return index
+
+    def mismatch_bitmap(self):
+        """Return a bytearray with bit i set when day i has different counts."""
+        bitmap = bytearray((self.size + 7) // 8)
+        for index in range(self.size):
+            if self.toggl[index] != self.notion[index]:
+                bitmap[index >> 3] |= 1 << (index & 7)
+        return bitmap
+
+    def mismatched_days(self):
+        bitmap = self.mismatch_bitmap()
+        return [index for index in range(self.size) if bitmap[index >> 3] & (1 << (index & 7))]
+
+    def mismatched_ranges(self, max_gap=0):
+        """Yield (first_day, last_day) runs of mismatched days, newest run first.
+
+        Runs separated by at most max_gap matching days are merged so nearby
+        holes are repaired in a single sync window.
+        """
+        runs = []
+        for index in self.mismatched_days():
+            if runs and index - runs[-1][1] <= max_gap + 1:
+                runs[-1][1] = index
+            else:
+                runs.append([index, index])
+        for first, last in reversed(runs):
+            yield self.day(first), self.day(last)
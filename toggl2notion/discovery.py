@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+
+DEFAULT_DISCOVERY_PATH = "toggl2notion_discovery.json"
+DISCOVERY_VERSION = 1
+
+
+def discovery_key():
+    """Fingerprint of the settings discovery depends on, so a changed setup misses the cache."""
+    names = sorted(
+        name for name in os.environ
+        if name in ("NOTION_PAGE", "HEATMAP_BLOCK_ID")
+        or name.endswith("_DATABASE_NAME")
+        or name.endswith("_DATABASE_ID")
+    )
+    raw = json.dumps(
+        {
+            "token": hashlib.sha1((os.getenv("NOTION_TOKEN") or "").encode("utf-8")).hexdigest(),
+            "env": {name: os.getenv(name) for name in names},
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class DiscoveryCache:
+    """JSON file holding discovered data source ids, the Time schema and the heatmap block id.
+
+    The file lives at NOTION_DISCOVERY_CACHE (default toggl2notion_discovery.json);
+    set it to "off" to disable caching. Entries written under another
+    discovery_key() are ignored.
+    """
+
+    def __init__(self, path=None):
+        path = os.getenv("NOTION_DISCOVERY_CACHE", DEFAULT_DISCOVERY_PATH) if path is None else path
+        self.path = None if path.strip().lower() in ("", "0", "off", "false") else path
+        self.key = discovery_key()
+
+    def load(self):
+        """Return the cached dict, or None when missing, stale or unreadable."""
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != DISCOVERY_VERSION or data.get("key") != self.key:
+            return None
+        return data
+
+    def save(self, data):
+        if not self.path:
+            return
+        data = dict(data, version=DISCOVERY_VERSION, key=self.key)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(data, file, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def update(self, **fields):
+        """Merge fields into an existing cache entry."""
+        data = self.load()
+        if data is not None:
+            data.update(fields)
+            self.save(data)
+
+    def invalidate(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,79 @@
+import os
+import re
+
+from .discovery import DiscoveryCache
+
+HEATMAP_URL_PREFIX = "https://heatmap.malinkang.com/"
+HEATMAP_URL_PATHS = ("/toggl/heatmap", "/time/heatmap")
+# A page id at the end of a URL path, bare or after the page title's slug
+PAGE_ID_PATTERN = re.compile(
+    r"(?:^|[/-])([0-9a-fA-F]{32}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$"
+)
+
+
+def is_heatmap_url(url):
+    if not url:
+        return False
+    return url.startswith(HEATMAP_URL_PREFIX) or any(path in url for path in HEATMAP_URL_PATHS)
+
+
+def extract_page_id(value):
+    """Return the dashed page id of a Notion page URL or raw id, or None when it holds none."""
+    # Drop ?v=<view id> and #<block id> suffixes, which hold ids of their own
+    path = re.split(r"[?#]", (value or "").strip(), maxsplit=1)[0].rstrip("/")
+    match = PAGE_ID_PATTERN.search(path)
+    if not match:
+        return None
+    raw = match.group(1).replace("-", "").lower()
+    return f"{raw[:8]}-{raw[8:12]}-{raw[12:16]}-{raw[16:20]}-{raw[20:]}"
+
+
+def find_heatmap_block(client, block_id):
+    """Walk the block tree under block_id breadth-first; return the last heatmap embed id found."""
+    found = None
+    pending = [block_id]
+    while pending:
+        parent_id = pending.pop(0)
+        kwargs = {"block_id": parent_id}
+        while True:
+            response = client.blocks.children.list(**kwargs)
+            for child in response.get("results", []):
+                if child.get("type") == "embed" and is_heatmap_url(child.get("embed", {}).get("url")):
+                    found = child.get("id")
+                if child.get("has_children"):
+                    pending.append(child["id"])
+            if not response.get("has_more") or not response.get("next_cursor"):
+                break
+            kwargs["start_cursor"] = response["next_cursor"]
+    return found
+
+
+def resolve_heatmap_block_id(client, cache=None, refresh=False):
+    """Return the heatmap block id from HEATMAP_BLOCK_ID, the discovery cache or a NOTION_PAGE walk.
+
+    A block found by walking is written back to the cache so later runs
+    skip the walk.
+    """
+    block_id = os.getenv("HEATMAP_BLOCK_ID")
+    if block_id:
+        return block_id
+    cache = cache or DiscoveryCache()
+    data = cache.load()
+    if data and data.get("heatmap_block_id") and not refresh:
+        return data["heatmap_block_id"]
+    notion_page = os.getenv("NOTION_PAGE")
+    if not notion_page:
+        return None
+    page_id = extract_page_id(notion_page)
+    if not page_id:
+        return None
+    block_id = find_heatmap_block(client, page_id)
+    if data is not None:
+        cache.update(heatmap_block_id=block_id)
+    elif block_id:
+        cache.save({"heatmap_block_id": block_id})
+    return block_id
+
+
+def update_heatmap_block(client, block_id, url):
+    return client.blocks.update(block_id=block_id, embed={"url": url})
@@ -0,0 +1,93 @@
+import sys
+import time
+from datetime import datetime, timezone
+
+import pendulum
+
+
+def parse_epoch(value):
+    """Parse an ISO 8601 timestamp into epoch seconds; naive values are taken as UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return pendulum.parse(value).int_timestamp
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def intern_text(value):
+    return sys.intern(value) if value else value
+
+
+class TimeEntry:
+    """One Toggl time entry, parsed once from whichever API returned it.
+
+    start and stop are epoch seconds (stop is None while the entry is
+    running) and descriptions and tag names are interned, since backfills
+    repeat the same few strings across many thousands of entries.
+    """
+
+    __slots__ = ("id", "description", "start", "stop", "tags", "project_id", "deleted")
+
+    def __init__(self, id, description, start, stop=None, tags=(), project_id=None, deleted=False):
+        self.id = int(id) if id is not None else None
+        self.description = intern_text(description)
+        self.start = start
+        self.stop = stop
+        self.tags = tuple(intern_text(tag) for tag in tags or ())
+        self.project_id = int(project_id) if project_id else None
+        self.deleted = deleted
+
+    @classmethod
+    def from_track(cls, data):
+        """Entry from the Track API v9 time_entries endpoints."""
+        return cls(
+            data.get("id"),
+            data.get("description"),
+            parse_epoch(data.get("start")),
+            parse_epoch(data.get("stop")),
+            data.get("tags"),
+            data.get("project_id") or data.get("pid"),
+            deleted=bool(data.get("server_deleted_at")),
+        )
+
+    @classmethod
+    def from_report_v2(cls, data):
+        """Entry from a Reports API v2 details row (which calls the stop time "end")."""
+        return cls(
+            data.get("id"),
+            data.get("description"),
+            parse_epoch(data.get("start")),
+            parse_epoch(data.get("end")),
+            data.get("tags"),
+            data.get("pid"),
+        )
+
+    @classmethod
+    def from_report_v3(cls, row, time_entry, tag_names):
+        """Entry from a Reports API v3 search row and one of its time entries; tag_names must cover every tag id."""
+        return cls(
+            time_entry.get("id"),
+            row.get("description"),
+            parse_epoch(time_entry.get("start")),
+            parse_epoch(time_entry.get("stop")),
+            [tag_names[tag_id] for tag_id in row.get("tag_ids") or []],
+            row.get("project_id"),
+        )
+
+    @property
+    def dedupe_key(self):
+        return self.id if self.id is not None else (self.start, self.description)
+
+    def stop_or_now(self):
+        """Stop time in epoch seconds; running entries stop "now"."""
+        return self.stop if self.stop is not None else int(time.time())
+
+    def start_iso(self):
+        return pendulum.from_timestamp(self.start, tz="Asia/Shanghai").to_iso8601_string()
+
+    def __repr__(self):
+        return f"TimeEntry(id={self.id!r}, start={self.start!r}, description={self.description!r})"
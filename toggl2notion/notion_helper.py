@@ -1,9 +1,23 @@
 import os
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
+import pendulum
 from notionhub.client import NotionHelperBase, TARGET_ICON_URL, TAG_ICON_URL, USER_ICON_URL, BOOKMARK_ICON_URL
 from notionhub.utils import get_icon, get_property_value, get_relation, get_title, get_date, format_date
 from notionhub.log import log
 
+from .config import FINGERPRINT_PROPERTY
+from .discovery import DiscoveryCache
+from .heatmap import find_heatmap_block, is_heatmap_url
+from .rate_limit import RateGovernor, parse_retry_after
+
+
+# Data sources resolved at startup; each is stored as <key>_data_source_id
+DATA_SOURCE_KEYS = ("TIME", "DAY", "WEEK", "MONTH", "YEAR", "ALL", "CLIENT", "PROJECT", "TAG")
+
 
 class NotionHelper(NotionHelperBase):
     database_id_dict = {}
@@ -11,17 +25,34 @@ class NotionHelper(NotionHelperBase):
 
     def __init__(self):
         super().__init__()
+        self.time_page_index = {}
+        self.time_fingerprints = {}
+        self.calendar_ranges = []
+        self.relation_index = {}
+        # data_source_id -> set of remote ids that still exist in Toggl
+        self.live_remote_ids = {}
+        # Write-behind buffer: page_id -> {"properties": {...}, "icon": ...}
+        self.pending_writes = {}
+        self.pending_lock = threading.Lock()
+        self.fingerprint_checked = False
+        # Notion allows an average of ~3 requests/s per integration
+        self.rate_governor = RateGovernor("Notion", rate=float(os.getenv("NOTION_RATE_LIMIT", "3")))
+        self.write_concurrency = max(1, int(os.getenv("NOTION_WRITE_CONCURRENCY", "1")))
+
+        self.discovery_cache = DiscoveryCache()
+        if not self.load_discovery():
+            self.discover()
+        if self.time_data_source_id:
+            self.write_data_source_id(self.time_data_source_id)
 
-        _, self.time_data_source_id = self.get_database_and_data_source_ids("TIME")
+    # --- Unique methods ---
+
+    def discover(self):
+        """Resolve every data source, the Time schema and the heatmap block, then cache them."""
+        for key in DATA_SOURCE_KEYS:
+            _, data_source_id = self.get_database_and_data_source_ids(key)
+            setattr(self, f"{key.lower()}_data_source_id", data_source_id)
         self.time_data_source_id = self.time_data_source_id or self.resolve_legacy_time_data_source_id()
-        _, self.day_data_source_id = self.get_database_and_data_source_ids("DAY")
-        _, self.week_data_source_id = self.get_database_and_data_source_ids("WEEK")
-        _, self.month_data_source_id = self.get_database_and_data_source_ids("MONTH")
-        _, self.year_data_source_id = self.get_database_and_data_source_ids("YEAR")
-        _, self.all_data_source_id = self.get_database_and_data_source_ids("ALL")
-        _, self.client_data_source_id = self.get_database_and_data_source_ids("CLIENT")
-        _, self.project_data_source_id = self.get_database_and_data_source_ids("PROJECT")
-        _, self.tag_data_source_id = self.get_database_and_data_source_ids("TAG")
         self.heatmap_block_id = os.getenv("HEATMAP_BLOCK_ID")
         notion_page = os.getenv("NOTION_PAGE")
         if notion_page and not self.heatmap_block_id:
@@ -30,11 +61,66 @@ class NotionHelper(NotionHelperBase):
             self.get_property_type(self.time_data_source_id)
             if self.time_data_source_id else ({}, None)
         )
+        missing = [key for key in DATA_SOURCE_KEYS if not getattr(self, f"{key.lower()}_data_source_id")]
+        if missing:
+            # Not cached, so data sources added later under NOTION_PAGE are found next run
+            log(f"未找到数据源 {', '.join(missing)}，本次不缓存查找结果。")
+        elif self.time_props:
+            self.discovery_cache.save(
+                {
+                    "data_sources": {
+                        key: getattr(self, f"{key.lower()}_data_source_id") for key in DATA_SOURCE_KEYS
+                    },
+                    "time_props": self.time_props,
+                    "time_title": self.time_title,
+                    "heatmap_block_id": self.heatmap_block_id,
+                }
+            )
 
-        if self.time_data_source_id:
-            self.write_data_source_id(self.time_data_source_id)
+    def load_discovery(self):
+        """Restore discovery from the cache, validated by one schema read of the Time data source.
 
-    # --- Unique methods ---
+        Returns False (and drops the cache) when it is missing, lacks any data
+        source or the Time data source can no longer be read.
+        """
+        data = self.discovery_cache.load()
+        data_sources = (data or {}).get("data_sources") or {}
+        if not all(data_sources.get(key) for key in DATA_SOURCE_KEYS):
+            return False
+        try:
+            time_props, time_title = self.get_property_type(data_sources["TIME"])
+        except Exception as e:
+            log(f"Notion 数据源缓存已失效，重新查找: {e}")
+            time_props, time_title = {}, None
+        if not time_props:
+            self.discovery_cache.invalidate()
+            return False
+        for key in DATA_SOURCE_KEYS:
+            setattr(self, f"{key.lower()}_data_source_id", data_sources.get(key))
+        self.heatmap_block_id = os.getenv("HEATMAP_BLOCK_ID") or data.get("heatmap_block_id")
+        self.time_props, self.time_title = time_props, time_title
+        if time_props != data.get("time_props") or time_title != data.get("time_title"):
+            self.discovery_cache.update(time_props=time_props, time_title=time_title)
+        return True
+
+    @staticmethod
+    def is_schema_error(error, data_source_call=False):
+        """Errors suggesting a cached id or property no longer matches the workspace.
+
+        A missing object (404) counts only for calls addressing a data source;
+        a deleted page is not drift. A validation_error counts only when it
+        complains about a property or data source that does not exist;
+        invalid content such as an unknown select option does not.
+        """
+        code = getattr(error, "code", None)
+        if code == "object_not_found" or getattr(error, "status", None) == 404:
+            return data_source_call
+        if code != "validation_error":
+            return False
+        message = str(error).lower()
+        if "data source" in message or "data_source" in message:
+            return "not found" in message or "does not exist" in message
+        return "property" in message and ("does not exist" in message or "not a property" in message)
 
     def resolve_legacy_time_data_source_id(self):
         raw_id = self.get_optional_env_value("TIME_DATABASE_NAME")
@@ -46,25 +132,11 @@ class NotionHelper(NotionHelperBase):
             return raw_id
 
     def is_heatmap_url(self, url):
-        if not url:
-            return False
-        return url.startswith("https://heatmap.malinkang.com/") or any(
-            path in url
-            for path in (
-                "/toggl/heatmap",
-                "/time/heatmap",
-            )
-        )
+        return is_heatmap_url(url)
 
     def search_database(self, block_id):
         try:
-            children = self.client.blocks.children.list(block_id=block_id)["results"]
-            for child in children:
-                if child["type"] == "embed" and child.get("embed", {}).get("url", ""):
-                    if self.is_heatmap_url(child["embed"]["url"]):
-                        self.heatmap_block_id = child.get("id")
-                if child.get("has_children"):
-                    self.search_database(child["id"])
+            self.heatmap_block_id = find_heatmap_block(self.client, block_id) or self.heatmap_block_id
         except Exception as e:
             log(f"搜索 Toggl 热力图时发生异常: {e}")
 
@@ -75,10 +147,35 @@ class NotionHelper(NotionHelperBase):
             raise ValueError(
                 "Time 数据源缺少必需的 'Id' number 字段，已停止同步以避免产生重复数据。"
             )
+        self.ensure_fingerprint_property()
+
+    def ensure_fingerprint_property(self):
+        """Add the 指纹 rich_text property to the Time data source when NOTION_FINGERPRINT_PROPERTY is on.
+
+        Without it unchanged entries are still skipped using the fingerprints
+        kept in the local state store.
+        """
+        if FINGERPRINT_PROPERTY in self.time_props or self.fingerprint_checked:
+            return
+        self.fingerprint_checked = True
+        if os.getenv("NOTION_FINGERPRINT_PROPERTY", "").strip().lower() not in ("1", "true", "yes", "on"):
+            return
+        try:
+            self.governed(
+                self.client.data_sources.update,
+                data_source_call=True,
+                data_source_id=self.time_data_source_id,
+                properties={FINGERPRINT_PROPERTY: {"rich_text": {}}},
+            )
+            self.time_props, self.time_title = self.get_property_type(self.time_data_source_id)
+            self.discovery_cache.update(time_props=self.time_props, time_title=self.time_title)
+            log(f"已为 Time 数据源添加 '{FINGERPRINT_PROPERTY}' 字段，用于跳过未变化的记录。")
+        except Exception as e:
+            log(f"无法添加 '{FINGERPRINT_PROPERTY}' 字段，未变化的记录将照常更新: {e}")
 
     def get_page_title(self, page_id):
         try:
-            page = self.client.pages.retrieve(page_id=page_id)
+            page = self.overlay_pending(self.client.pages.retrieve(page_id=page_id))
             return self.get_title_from_page(page), page
         except Exception:
             return None, None
@@ -107,20 +204,64 @@ class NotionHelper(NotionHelperBase):
             with open(env_file, "a") as file:
                 file.write(f"DATABASE_ID={data_source_id}\n")
 
-    def get_page_by_toggl_id(self, toggl_id):
-        """Find the Notion page ID for a given Toggl ID."""
-        filter = {"property": "Id", "number": {"equals": int(toggl_id)}}
-        try:
-            response = self.query(
-                data_source_id=self.time_data_source_id, filter=filter, page_size=1
-            )
-            results = response.get("results")
-            return results[0].get("id") if results else None
-        except Exception as e:
-            error_str = str(e).lower()
-            if "id" in error_str and ("property" in error_str or "exists" in error_str):
-                return None
-            raise e
+    def iter_query(self, data_source_id, filter=None, sorts=None, page_size=100):
+        """Yield every page of a data source query, following Notion's cursors."""
+        kwargs = {"data_source_id": data_source_id, "page_size": page_size}
+        if filter:
+            kwargs["filter"] = filter
+        if sorts:
+            kwargs["sorts"] = sorts
+        while True:
+            response = self.governed(self.query, data_source_call=True, **kwargs)
+            for page in response.get("results", []):
+                yield page
+            if not response.get("has_more") or not response.get("next_cursor"):
+                break
+            kwargs["start_cursor"] = response.get("next_cursor")
+
+    def index_time_pages(self, start, end):
+        """Load the Toggl Id -> page id mapping for Time pages starting in [start, end]."""
+        filter = {
+            "and": [
+                {"property": "Id", "number": {"is_not_empty": True}},
+                {"property": "时间", "date": {"on_or_after": start.to_iso8601_string()}},
+                {"property": "时间", "date": {"on_or_before": end.to_iso8601_string()}},
+            ]
+        }
+        count = 0
+        for page in self.iter_query(self.time_data_source_id, filter=filter):
+            toggl_id, fingerprint, _, _ = self.parse_time_page(page)
+            if toggl_id is None:
+                continue
+            self.time_page_index[toggl_id] = page.get("id")
+            if fingerprint:
+                self.time_fingerprints[toggl_id] = fingerprint
+            count += 1
+        return count
+
+    def parse_time_page(self, page):
+        """Return (toggl_id, fingerprint, start, stop) of a Time page; times are epoch seconds."""
+        props = page.get("properties", {})
+        toggl_id = props.get("Id", {}).get("number")
+        fingerprint_prop = props.get(FINGERPRINT_PROPERTY)
+        fingerprint = get_property_value(fingerprint_prop) if fingerprint_prop else None
+        date = props.get("时间", {}).get("date") or {}
+        start = pendulum.parse(date["start"]).int_timestamp if date.get("start") else None
+        stop = pendulum.parse(date["end"]).int_timestamp if date.get("end") else None
+        return (int(toggl_id) if toggl_id is not None else None), fingerprint, start, stop
+
+    def iter_time_pages(self, start=None, end=None):
+        """Yield every Time page that carries a Toggl Id, optionally only those starting in [start, end]."""
+        filter = {"property": "Id", "number": {"is_not_empty": True}}
+        if start and end:
+            filter = {
+                "and": [
+                    filter,
+                    {"property": "时间", "date": {"on_or_after": start.to_iso8601_string()}},
+                    {"property": "时间", "date": {"on_or_before": end.to_iso8601_string()}},
+                ]
+            }
+        yield from self.iter_query(self.time_data_source_id, filter=filter)
 
     def query_missing_toggl_id(self):
         """Query entries in Time database that are missing a Toggl ID."""
@@ -133,8 +274,21 @@ class NotionHelper(NotionHelperBase):
                 return []
             raise e
 
+    def get_relation_remote_id(self, data_source_id, page_id):
+        """Toggl Id of a Project/Client page, from the preloaded index when available."""
+        pending = self.pending_property(page_id, "Id")
+        if pending and pending.get("number") is not None:
+            return pending["number"]
+        index = self.relation_index.get(data_source_id)
+        if index is not None:
+            return index["remote_ids"].get(page_id)
+        return self.get_remote_id_from_page(page_id)
+
     def get_remote_id_from_page(self, page_id):
         """Retrieve the 'Id' (Toggl ID) from a Notion page (Project/Client)."""
+        pending = self.pending_property(page_id, "Id")
+        if pending and pending.get("number") is not None:
+            return pending["number"]
         try:
             page = self.client.pages.retrieve(page_id=page_id)
             props = page.get("properties", {})
@@ -154,9 +308,14 @@ class NotionHelper(NotionHelperBase):
         page_id = None
         results = []
         title_prop = self.get_title_property_name(id)
+        indexed = id in self.relation_index
+
+        # 0. Answer from the preloaded index; a miss there means the page does not exist
+        if indexed:
+            page_id = self.find_indexed_relation(name, id, icon, properties, remote_id)
 
         # 1. Try to find by remote_id if provided
-        if remote_id:
+        if remote_id and not indexed:
             filter = {"property": "Id", "number": {"equals": int(remote_id)}}
             try:
                 response = self.query(data_source_id=id, filter=filter)
@@ -168,7 +327,7 @@ class NotionHelper(NotionHelperBase):
                     if existing_name != name:
                         log(f"Updating name for ID {remote_id}: '{existing_name}' -> '{name}'")
                         properties[title_prop] = get_title(name)
-                        self.update_page(page_id, properties, icon)
+                        self.queue_update(page_id, properties, icon)
             except Exception as e:
                 error_str = str(e).lower()
                 if "id" in error_str and ("property" in error_str or "exists" in error_str):
@@ -178,7 +337,7 @@ class NotionHelper(NotionHelperBase):
                     raise e
 
         # 2. Fallback to name-based lookup if not found by ID or ID not provided
-        if not page_id:
+        if not page_id and not indexed:
             filter = {"property": title_prop, "title": {"equals": name}}
             try:
                 response = self.query(data_source_id=id, filter=filter)
@@ -190,15 +349,9 @@ class NotionHelper(NotionHelperBase):
             if results:
                 page_id = results[0].get("id")
                 if remote_id:
-                    try:
-                        properties["Id"] = {"number": int(remote_id)}
-                        self.update_page(page_id, properties, icon)
-                    except Exception as e:
-                        error_str = str(e).lower()
-                        if "id" in error_str and ("property" in error_str or "exists" in error_str):
-                            log(f"Could not write 'Id' to database {id}: Property missing.")
-                        else:
-                            log(f"Error writing 'Id' to database {id}: {e}")
+                    # update_page drops 'Id' itself if the property is missing
+                    properties["Id"] = {"number": int(remote_id)}
+                    self.queue_update(page_id, properties, icon)
 
         # 3. Create if still not found
         if not page_id:
@@ -221,12 +374,104 @@ class NotionHelper(NotionHelperBase):
                     ).get("id")
                 else:
                     raise e
+            if indexed:
+                self.index_relation(id, page_id, name, remote_id)
 
         self._NotionHelperBase__cache[fetch_key] = page_id
         return page_id
 
-    # Override get_day_relation_id to include year/month/week in day properties
-    def get_day_relation_id(self, date):
+    @staticmethod
+    def normalize_title(name):
+        return unicodedata.normalize("NFC", name or "").strip()
+
+    def load_relation_index(self, data_source_id):
+        """Index every page of a relation data source by remote Id and normalized title."""
+        self.relation_index[data_source_id] = {
+            "by_id": {},
+            "by_title": {},
+            "titles": {},
+            "remote_ids": {},
+            "clients": {},
+        }
+        count = 0
+        for page in self.iter_query(data_source_id):
+            remote_id = page.get("properties", {}).get("Id", {}).get("number")
+            title = self.get_title_from_page(page)
+            self.index_relation(data_source_id, page.get("id"), title, remote_id, overwrite=False)
+            # Projects link to their Client; kept so reverse sync needs no page retrieves
+            client_page_id = self.get_relation_page(page, ["Client", "客户", "客户端"])
+            if client_page_id:
+                self.relation_index[data_source_id]["clients"][page.get("id")] = client_page_id
+            count += 1
+        return count
+
+    def preload_relations(self):
+        """Load the TAG, PROJECT and CLIENT data sources so relations resolve from memory."""
+        for name, data_source_id in (
+            ("TAG", self.tag_data_source_id),
+            ("PROJECT", self.project_data_source_id),
+            ("CLIENT", self.client_data_source_id),
+        ):
+            if not data_source_id:
+                continue
+            try:
+                count = self.load_relation_index(data_source_id)
+                log(f"Preloaded {count} {name} pages")
+            except Exception as e:
+                self.relation_index.pop(data_source_id, None)
+                log(f"Failed to preload {name} pages, falling back to per-item lookups: {e}")
+
+    def index_relation(self, data_source_id, page_id, title, remote_id=None, overwrite=True):
+        index = self.relation_index[data_source_id]
+        if title is not None:
+            key = self.normalize_title(title)
+            if overwrite or key not in index["by_title"]:
+                index["by_title"][key] = page_id
+            index["titles"][page_id] = title
+        if remote_id is not None:
+            if overwrite or int(remote_id) not in index["by_id"]:
+                index["by_id"][int(remote_id)] = page_id
+            index["remote_ids"][page_id] = int(remote_id)
+
+    def rename_indexed_relation(self, name, id, icon, remote_id):
+        """Rename the page indexed under remote_id if its title differs; never links by title."""
+        index = self.relation_index[id]
+        page_id = index["by_id"].get(int(remote_id))
+        if page_id and index["titles"].get(page_id) != name:
+            log(f"Updating name for ID {remote_id}: '{index['titles'].get(page_id)}' -> '{name}'")
+            self.queue_update(page_id, {self.get_title_property_name(id): get_title(name)}, icon)
+            self.index_relation(id, page_id, name, remote_id)
+        return page_id
+
+    def find_indexed_relation(self, name, id, icon, properties, remote_id=None):
+        """Find a relation page in the index, writing only renames and missing Ids."""
+        index = self.relation_index[id]
+        title_prop = self.get_title_property_name(id)
+        page_id = index["by_id"].get(int(remote_id)) if remote_id else None
+        if page_id:
+            existing_name = index["titles"].get(page_id)
+            if existing_name != name:
+                log(f"Updating name for ID {remote_id}: '{existing_name}' -> '{name}'")
+                properties[title_prop] = get_title(name)
+                self.queue_update(page_id, properties, icon)
+                self.index_relation(id, page_id, name, remote_id)
+            return page_id
+
+        page_id = index["by_title"].get(self.normalize_title(name))
+        existing_id = index["remote_ids"].get(page_id) if page_id else None
+        if remote_id and existing_id is not None and existing_id != int(remote_id):
+            live = self.live_remote_ids.get(id)
+            if live is None or existing_id in live:
+                # Same title but another Toggl object still owns this page
+                return None
+        if page_id and remote_id and existing_id != int(remote_id):
+            properties["Id"] = {"number": int(remote_id)}
+            self.queue_update(page_id, properties, icon)
+            self.index_relation(id, page_id, name, remote_id)
+        return page_id
+
+    # Calendar periods: each *_period(date) returns (title, data_source_id, properties)
+    def day_period(self, date):
         new_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
         day = new_date.strftime("%Y年%m月%d日")
         properties = {
@@ -235,39 +480,158 @@ class NotionHelper(NotionHelperBase):
         properties["年"] = get_relation([self.get_year_relation_id(new_date)])
         properties["月"] = get_relation([self.get_month_relation_id(new_date)])
         properties["周"] = get_relation([self.get_week_relation_id(new_date)])
-        return self.get_relation_id(
-            day, self.day_data_source_id, get_icon(TARGET_ICON_URL), properties
-        )
+        return day, self.day_data_source_id, properties
 
-    # Override date relation methods to use get_icon(TARGET_ICON_URL) instead of date icon
-    def get_week_relation_id(self, date):
+    def week_period(self, date):
         from notionhub.utils import get_first_and_last_day_of_week
         year = date.isocalendar().year
         week = date.isocalendar().week
         week = f"{year}年第{week}周"
         start, end = get_first_and_last_day_of_week(date)
         properties = {"日期": get_date(format_date(start), format_date(end))}
-        return self.get_relation_id(
-            week, self.week_data_source_id, get_icon(TARGET_ICON_URL), properties
-        )
+        return week, self.week_data_source_id, properties
 
-    def get_month_relation_id(self, date):
+    def month_period(self, date):
         from notionhub.utils import get_first_and_last_day_of_month
         month = date.strftime("%Y年%-m月")
         start, end = get_first_and_last_day_of_month(date)
         properties = {"日期": get_date(format_date(start), format_date(end))}
-        return self.get_relation_id(
-            month, self.month_data_source_id, get_icon(TARGET_ICON_URL), properties
-        )
+        return month, self.month_data_source_id, properties
 
-    def get_year_relation_id(self, date):
+    def year_period(self, date):
         from notionhub.utils import get_first_and_last_day_of_year
         year = date.strftime("%Y")
         start, end = get_first_and_last_day_of_year(date)
         properties = {"日期": get_date(format_date(start), format_date(end))}
-        return self.get_relation_id(
-            year, self.year_data_source_id, get_icon(TARGET_ICON_URL), properties
+        return year, self.year_data_source_id, properties
+
+    def calendar_covers(self, date):
+        day = date.to_date_string()
+        return any(lo <= day <= hi for lo, hi in self.calendar_ranges)
+
+    def find_page_by_title(self, data_source_id, name):
+        """Return the id of the first page in data_source_id titled name, or None."""
+        filter = {"property": self.get_title_property_name(data_source_id), "title": {"equals": name}}
+        response = self.governed(self.query, data_source_call=True, data_source_id=data_source_id, filter=filter, page_size=1)
+        results = response.get("results")
+        return results[0].get("id") if results else None
+
+    def get_period_relation_id(self, date, name, id, properties):
+        """Resolve a calendar page, creating it when neither the index nor a title lookup finds it.
+
+        The index is built from 日期, so pages with an empty or different
+        日期 (hand-made or older pages) are still matched by title.
+        """
+        fetch_key = f"{id}{name}"
+        cache = self._NotionHelperBase__cache
+        if fetch_key in cache:
+            return cache[fetch_key]
+        if not self.calendar_covers(date):
+            return self.get_relation_id(name, id, get_icon(TARGET_ICON_URL), properties)
+        page_id = self.find_page_by_title(id, name)
+        if page_id:
+            cache[fetch_key] = page_id
+            return page_id
+        properties[self.get_title_property_name(id)] = get_title(name)
+        page_id = self.create_page(
+            parent={"data_source_id": id, "type": "data_source_id"},
+            properties=properties,
+            icon=get_icon(TARGET_ICON_URL),
+        ).get("id")
+        cache[fetch_key] = page_id
+        return page_id
+
+    def load_calendar_index(self, start, end):
+        """Load every existing DAY/WEEK/MONTH/YEAR page overlapping [start, end] with one paged query each."""
+        cache = self._NotionHelperBase__cache
+        sources = (
+            (self.year_data_source_id, start.start_of("year")),
+            (self.month_data_source_id, start.start_of("month")),
+            (self.week_data_source_id, start.start_of("week")),
+            (self.day_data_source_id, start.start_of("day")),
         )
+        count = 0
+        for data_source_id, lower in sources:
+            if not data_source_id:
+                continue
+            filter = {
+                "and": [
+                    {"property": "日期", "date": {"on_or_after": lower.to_date_string()}},
+                    {"property": "日期", "date": {"on_or_before": end.to_date_string()}},
+                ]
+            }
+            for page in self.iter_query(data_source_id, filter=filter):
+                title = self.get_title_from_page(page)
+                if title:
+                    cache.setdefault(f"{data_source_id}{title}", page.get("id"))
+                    count += 1
+        self.calendar_ranges.append((start.to_date_string(), end.to_date_string()))
+        log(f"Loaded {count} calendar pages for {start.to_date_string()} ~ {end.to_date_string()}")
+
+    def prepare_calendar(self, dates, window=None):
+        """Make sure every period page for dates exists, creating missing ones level by level.
+
+        When the index does not cover dates yet, the (start, end) window is
+        loaded if given, otherwise just the span of dates. Years, months and
+        weeks are created first (in parallel through run_writes) because day
+        pages relate to them.
+        """
+        days = {}
+        for date in dates:
+            day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+            days.setdefault(day.to_date_string(), date)
+        if not days:
+            return
+        ordered = [days[key] for key in sorted(days)]
+        if not all(self.calendar_covers(date) for date in ordered):
+            start, end = window or (ordered[0], ordered[-1])
+            self.load_calendar_index(min(start, ordered[0]), max(end, ordered[-1]))
+
+        cache = self._NotionHelperBase__cache
+        for period in (self.year_period, self.month_period, self.week_period, self.day_period):
+            missing = {}
+            for date in ordered:
+                name, id, properties = period(date)
+                if id and f"{id}{name}" not in cache:
+                    missing.setdefault(f"{id}{name}", (name, id, properties))
+            # The index only holds pages whose 日期 falls in range; check titles before creating
+            for fetch_key, (name, id, _) in list(missing.items()):
+                page_id = self.find_page_by_title(id, name)
+                if page_id:
+                    cache[fetch_key] = page_id
+                    del missing[fetch_key]
+            if not missing:
+                continue
+            jobs = []
+            for name, id, properties in missing.values():
+                properties[self.get_title_property_name(id)] = get_title(name)
+                jobs.append(
+                    partial(
+                        self.create_page,
+                        parent={"data_source_id": id, "type": "data_source_id"},
+                        properties=properties,
+                        icon=get_icon(TARGET_ICON_URL),
+                    )
+                )
+            for fetch_key, (page, error) in zip(missing, self.run_writes(jobs)):
+                if error:
+                    log(f"Failed to create calendar page {fetch_key}: {error}")
+                    continue
+                cache[fetch_key] = page.get("id")
+
+    # Override get_day_relation_id to include year/month/week in day properties
+    def get_day_relation_id(self, date):
+        return self.get_period_relation_id(date, *self.day_period(date))
+
+    # Override date relation methods to use get_icon(TARGET_ICON_URL) instead of date icon
+    def get_week_relation_id(self, date):
+        return self.get_period_relation_id(date, *self.week_period(date))
+
+    def get_month_relation_id(self, date):
+        return self.get_period_relation_id(date, *self.month_period(date))
+
+    def get_year_relation_id(self, date):
+        return self.get_period_relation_id(date, *self.year_period(date))
 
     # Override get_date_relation to include 全部
     def get_date_relation(self, properties, date, include_day=True):
@@ -279,34 +643,148 @@ class NotionHelper(NotionHelperBase):
             [self.get_relation_id("全部", id=self.all_data_source_id, icon=get_icon(TARGET_ICON_URL))]
         )
 
+    @staticmethod
+    def classify_notion_error(outcome):
+        """Retry policy for RateGovernor: retry rate limits and transient server errors."""
+        if not isinstance(outcome, Exception):
+            return False, None
+        status = getattr(outcome, "status", None)
+        code = getattr(outcome, "code", None)
+        if status in RateGovernor.RETRY_STATUSES or code in ("rate_limited", "service_unavailable"):
+            return True, parse_retry_after(getattr(outcome, "headers", None))
+        return False, None
+
+    @staticmethod
+    def classify_notion_create(outcome):
+        """Retry policy for creates: only rate limits, which Notion rejects before doing anything."""
+        status = getattr(outcome, "status", None)
+        code = getattr(outcome, "code", None)
+        if isinstance(outcome, Exception) and (status == 429 or code == "rate_limited"):
+            return True, parse_retry_after(getattr(outcome, "headers", None))
+        return False, None
+
+    def governed(self, func, idempotent=True, data_source_call=False, **kwargs):
+        """Call func through the rate governor; data_source_call marks calls addressing a data source."""
+        classify = self.classify_notion_error if idempotent else self.classify_notion_create
+        try:
+            return self.rate_governor.call(lambda: func(**kwargs), classify)
+        except Exception as e:
+            if self.is_schema_error(e, data_source_call):
+                # Rediscover next run instead of trusting cached ids
+                self.discovery_cache.invalidate()
+            raise
+
     # Override update_page to support icon parameter
     def update_page(self, page_id, properties, icon=None, cover=None):
         kwargs = {"page_id": page_id, "properties": properties}
         if icon:
             kwargs["icon"] = icon
         try:
-            return self.client.pages.update(**kwargs)
+            return self.governed(self.client.pages.update, **kwargs)
         except Exception as e:
             error_str = str(e).lower()
             if "id" in error_str and ("property" in error_str or "exists" in error_str) and "Id" in properties:
                 log(f"Property 'Id' missing in database. Updating without 'Id'.")
                 new_props = {k: v for k, v in properties.items() if k != "Id"}
                 kwargs["properties"] = new_props
-                return self.client.pages.update(**kwargs)
+                return self.governed(self.client.pages.update, **kwargs)
             raise e
 
     # Override create_page to handle Id property errors
     def create_page(self, parent, properties, icon=None, cover=None):
         parent = self.normalize_parent(parent)
         try:
-            return self.client.pages.create(parent=parent, properties=properties, icon=icon)
+            return self.governed(self.client.pages.create, idempotent=False, data_source_call=True, parent=parent, properties=properties, icon=icon)
         except Exception as e:
             error_str = str(e).lower()
             if "id" in error_str and ("property" in error_str or "exists" in error_str) and "Id" in properties:
                 log(f"Property 'Id' missing in main database. Retrying without 'Id'.")
                 new_props = {k: v for k, v in properties.items() if k != "Id"}
-                return self.client.pages.create(parent=parent, properties=new_props, icon=icon)
+                return self.governed(self.client.pages.create, idempotent=False, data_source_call=True, parent=parent, properties=new_props, icon=icon)
             raise e
 
+    def archive_page(self, page_id):
+        return self.governed(self.client.pages.update, page_id=page_id, archived=True)
+
+    def queue_update(self, page_id, properties, icon=None):
+        """Buffer a property patch for page_id; patches to the same page merge until flush_writes."""
+        with self.pending_lock:
+            pending = self.pending_writes.setdefault(page_id, {"properties": {}, "icon": None})
+            pending["properties"].update(properties)
+            if icon:
+                pending["icon"] = icon
+
+    def take_pending(self, page_id, properties, icon=None):
+        """Fold any buffered patch for page_id under properties/icon and drop it from the buffer.
+
+        Used when a page is about to be written anyway so it is written once.
+        """
+        with self.pending_lock:
+            pending = self.pending_writes.pop(page_id, None)
+        if not pending:
+            return properties, icon
+        return dict(pending["properties"], **properties), icon or pending["icon"]
+
+    def pending_property(self, page_id, name):
+        with self.pending_lock:
+            pending = self.pending_writes.get(page_id)
+            return pending["properties"].get(name) if pending else None
+
+    def overlay_pending(self, page):
+        """Return page with buffered patches applied, so reads see unflushed writes."""
+        with self.pending_lock:
+            pending = self.pending_writes.get(page.get("id")) if page else None
+            patch = dict(pending["properties"]) if pending else None
+        if not patch:
+            return page
+        props = dict(page.get("properties", {}))
+        for name, value in patch.items():
+            merged = dict(props.get(name, {}), **value)
+            for key in ("title", "rich_text"):
+                if isinstance(merged.get(key), list):
+                    merged[key] = [
+                        dict(item, plain_text=item.get("plain_text") or item.get("text", {}).get("content", ""))
+                        for item in merged[key]
+                    ]
+            props[name] = merged
+        return dict(page, properties=props)
+
+    def flush_writes(self):
+        """Write every buffered page once; returns the set of page ids that failed."""
+        with self.pending_lock:
+            pending, self.pending_writes = self.pending_writes, {}
+        if not pending:
+            return set()
+        items = list(pending.items())
+        jobs = [
+            partial(self.update_page, page_id=page_id, properties=patch["properties"], icon=patch["icon"])
+            for page_id, patch in items
+        ]
+        failed = set()
+        for (page_id, _), (_, error) in zip(items, self.run_writes(jobs)):
+            if error:
+                log(f"Failed to flush buffered update for {page_id}: {error}")
+                failed.add(page_id)
+        return failed
+
+    def run_writes(self, jobs):
+        """Run write callables on the worker pool, yielding (result, error) in submission order.
+
+        Every worker shares rate_governor, so raising NOTION_WRITE_CONCURRENCY
+        overlaps request latency without exceeding Notion's request budget.
+        """
+        def run(job):
+            try:
+                return job(), None
+            except Exception as e:
+                return None, e
+
+        if self.write_concurrency <= 1:
+            for job in jobs:
+                yield run(job)
+            return
+        with ThreadPoolExecutor(max_workers=self.write_concurrency) as executor:
+            yield from executor.map(run, jobs)
+
     def query_all_by_book(self, data_source_id, filter):
         return self.query_all_by_filter(data_source_id, filter)
@@ -0,0 +1,134 @@
+import threading
+import time
+from queue import Empty, Full, Queue
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(iterable, depth=1):
+    """Iterate iterable on a background thread, keeping at most depth items buffered.
+
+    The producer blocks once the queue is full, so a slow consumer applies
+    backpressure instead of letting fetched data pile up. Exceptions raised
+    by the producer are re-raised in the consumer, and closing the returned
+    generator early stops the producer at its next item.
+    """
+    queue = Queue(maxsize=max(1, depth))
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name="toggl2notion-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item = queue.get(timeout=0.1)
+            except Empty:
+                if not thread.is_alive() and queue.empty():
+                    return
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+class WindowPolicy:
+    """Choose sync window lengths (in days) from the entry density seen so far.
+
+    Sparse windows double the next window up to max_days; dense windows
+    shrink it so a window holds roughly target_entries, and a window that
+    reaches limit_entries (where the API starts truncating or paging
+    heavily) is halved straight away.
+    """
+
+    def __init__(self, name, initial_days, min_days, max_days, target_entries, limit_entries):
+        self.name = name
+        self.days = initial_days
+        self.min_days = min_days
+        self.max_days = max_days
+        self.target_entries = target_entries
+        self.limit_entries = limit_entries
+
+    def observe(self, days, count):
+        if count >= self.limit_entries:
+            proposed = days // 2
+        elif count == 0:
+            proposed = days * 2
+        else:
+            ideal = int(days * self.target_entries / count)
+            # Grow at most 2x per step; shrink as far as the density demands
+            proposed = min(ideal, days * 2)
+        self.days = max(self.min_days, min(self.max_days, proposed))
+        return self.days
+
+
+class RunBudget:
+    """Wall-clock and API-call caps for one run.
+
+    exhausted() turns true once max_seconds (less reserve_seconds, kept for
+    finishing the current batch and reporting) have elapsed or the governors
+    together have made max_calls requests. Either cap may be None.
+    """
+
+    def __init__(self, max_seconds=None, max_calls=None, reserve_seconds=None, governors=()):
+        self.max_seconds = max_seconds
+        self.max_calls = max_calls
+        if reserve_seconds is None:
+            reserve_seconds = min(120.0, max_seconds * 0.1) if max_seconds else 0.0
+        self.reserve_seconds = reserve_seconds
+        self.governors = list(governors)
+        self.started_at = time.monotonic()
+
+    @property
+    def limited(self):
+        return self.max_seconds is not None or self.max_calls is not None
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def calls(self):
+        return sum(governor.calls for governor in self.governors)
+
+    def exhausted(self):
+        if self.max_seconds is not None and self.elapsed() >= self.max_seconds - self.reserve_seconds:
+            return True
+        if self.max_calls is not None and self.calls() >= self.max_calls:
+            return True
+        return False
+
+    def describe(self):
+        parts = [f"{self.elapsed():.0f}s"]
+        if self.max_seconds is not None:
+            parts[0] += f"/{self.max_seconds:.0f}s"
+        calls = f"{self.calls()} calls"
+        if self.max_calls is not None:
+            calls = f"{self.calls()}/{self.max_calls} calls"
+        parts.append(calls)
+        return ", ".join(parts)
@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+
+from notionhub.log import log
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker hitting the same API."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Block until a token is available and return the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RateGovernor:
+    """Adaptive pacing and retry policy for one API.
+
+    Requests are paced through a token bucket whose rate grows slowly while
+    calls succeed and is halved whenever the API throttles us. Throttled or
+    transiently failing calls are retried after the server's Retry-After
+    (or quota reset) delay, falling back to jittered exponential backoff.
+    Time spent waiting is accumulated in total_wait for the run summary.
+    """
+
+    RETRY_STATUSES = (429, 502, 503, 504)
+
+    def __init__(self, name, rate, min_rate=None, max_rate=None, max_retries=8, max_delay=60.0):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.min_rate = float(min_rate or rate / 8)
+        self.max_rate = float(max_rate or rate)
+        self.max_retries = max_retries
+        self.max_delay = max_delay
+        self.total_wait = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def _set_rate(self, rate):
+        with self.bucket.lock:
+            self.bucket.rate = min(self.max_rate, max(self.min_rate, rate))
+
+    def acquire(self):
+        waited = self.bucket.acquire()
+        with self.lock:
+            self.calls += 1
+            self.total_wait += waited
+
+    def sleep(self, delay):
+        time.sleep(delay)
+        with self.lock:
+            self.total_wait += delay
+
+    def on_success(self):
+        # Additive increase: creep back up towards max_rate while the API is happy
+        if self.rate < self.max_rate:
+            self._set_rate(self.rate + self.max_rate / 20)
+
+    def on_throttle(self):
+        with self.lock:
+            self.throttled += 1
+        self._set_rate(self.rate / 2)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, 0.25)
+        return min(self.max_delay, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def call(self, func, classify):
+        """Run func() under the governor.
+
+        classify(result_or_exception) returns (retry, retry_after_seconds).
+        Exceptions are re-raised and results returned once no retry is wanted
+        or max_retries is exhausted.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result, error = func(), None
+            except Exception as e:
+                result, error = None, e
+            retry, retry_after = classify(error if error is not None else result)
+            if not retry or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                if not retry:
+                    self.on_success()
+                return result
+            self.on_throttle()
+            delay = self.backoff_delay(attempt, retry_after)
+            log(f"⏳ {self.name} throttled, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            self.sleep(delay)
+            attempt += 1
+
+
+def parse_retry_after(headers):
+    """Return the server-requested delay in seconds from response headers, if any."""
+    if not headers:
+        return None
+    for key in ("Retry-After", "X-Toggl-Quota-Resets-In"):
+        value = headers.get(key)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            continue
+    return None
@@ -0,0 +1,227 @@
+import os
+import sqlite3
+import threading
+
+DEFAULT_STATE_PATH = "toggl2notion_state.db"
+
+
+class StateStore:
+    """Local SQLite mirror of synced entries plus named sync cursors.
+
+    Entries map a Toggl id to its Notion page id, content fingerprint and
+    start/stop epoch seconds so anchors and existence checks do not need to
+    query Notion. Cursors are small named string values (ISO timestamps,
+    counters, ...) that persist between runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                toggl_id INTEGER PRIMARY KEY,
+                page_id TEXT NOT NULL,
+                fingerprint TEXT,
+                start INTEGER,
+                stop INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS entries_start ON entries (start);
+            CREATE TABLE IF NOT EXISTS cursors (
+                name TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS windows (
+                kind TEXT NOT NULL,
+                range_start INTEGER NOT NULL,
+                range_end INTEGER NOT NULL,
+                entries INTEGER,
+                status TEXT,
+                PRIMARY KEY (kind, range_start, range_end)
+            );
+            CREATE TABLE IF NOT EXISTS reverse_pending (
+                page_id TEXT PRIMARY KEY,
+                toggl_id INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS clients (
+                id INTEGER PRIMARY KEY,
+                workspace_id INTEGER,
+                name TEXT
+            );
+            CREATE TABLE IF NOT EXISTS projects (
+                id INTEGER PRIMARY KEY,
+                workspace_id INTEGER,
+                name TEXT,
+                client_id INTEGER,
+                active INTEGER
+            );
+            """
+        )
+        self.conn.commit()
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone() is None
+
+    def iter_entries(self):
+        """Yield (toggl_id, page_id, fingerprint) for every stored entry."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT toggl_id, page_id, fingerprint FROM entries"
+            ).fetchall()
+        yield from rows
+
+    def get_entry(self, toggl_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT toggl_id, page_id, fingerprint, start, stop FROM entries WHERE toggl_id = ?",
+                (int(toggl_id),),
+            ).fetchone()
+
+    def upsert_entry(self, toggl_id, page_id, fingerprint=None, start=None, stop=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (toggl_id, page_id, fingerprint, start, stop) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (int(toggl_id), page_id, fingerprint, start, stop),
+            )
+            self.conn.commit()
+
+    def iter_entries_between(self, start, end):
+        """Yield (toggl_id, page_id, start, stop) for entries starting in [start, end] (epoch seconds)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT toggl_id, page_id, start, stop FROM entries WHERE start BETWEEN ? AND ?",
+                (int(start), int(end)),
+            ).fetchall()
+        yield from rows
+
+    def delete_entry(self, toggl_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries WHERE toggl_id = ?", (int(toggl_id),))
+            self.conn.commit()
+
+    def bounds(self):
+        """Return (earliest start, latest stop) epoch seconds, or (None, None) when empty."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT MIN(start), MAX(COALESCE(stop, start)) FROM entries"
+            ).fetchone()
+
+    def get_cursor(self, name, default=None):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM cursors WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def set_cursor(self, name, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cursors (name, value) VALUES (?, ?)",
+                (name, None if value is None else str(value)),
+            )
+            self.conn.commit()
+
+    def record_window(self, kind, start, end, entries, status):
+        """Journal a sync window [start, end] (epoch seconds) with its outcome."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO windows (kind, range_start, range_end, entries, status) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, int(start), int(end), entries, status),
+            )
+            self.conn.commit()
+
+    def resume_point(self, kind, upper):
+        """Walk down from upper through contiguous complete windows.
+
+        Returns the latest second at or below upper that no complete window
+        covers; returns upper itself when nothing there is journaled yet.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT range_start, range_end FROM windows "
+                "WHERE kind = ? AND status = 'complete' AND range_start <= ? "
+                "ORDER BY range_end DESC",
+                (kind, int(upper)),
+            ).fetchall()
+        point = int(upper)
+        for start, end in rows:
+            # Windows are contiguous when the next one ends a second before the previous start
+            if start <= point <= end + 1:
+                point = min(point, start - 1)
+        return point
+
+    def load_reverse_pending(self):
+        """Return {page_id: toggl_id or None} for Notion pages whose reverse sync was started."""
+        with self.lock:
+            rows = self.conn.execute("SELECT page_id, toggl_id FROM reverse_pending").fetchall()
+        return dict(rows)
+
+    def mark_reverse_pending(self, rows):
+        """Record (page_id, toggl_id) rows; toggl_id is None until Toggl confirms the create."""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO reverse_pending (page_id, toggl_id) VALUES (?, ?)", rows
+            )
+            self.conn.commit()
+
+    def clear_reverse_pending(self, page_ids):
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM reverse_pending WHERE page_id = ?", [(page_id,) for page_id in page_ids]
+            )
+            self.conn.commit()
+
+    def load_workspace_meta(self):
+        """Return (clients, projects) rows for every workspace in one read."""
+        with self.lock:
+            clients = self.conn.execute(
+                "SELECT id, workspace_id, name FROM clients"
+            ).fetchall()
+            projects = self.conn.execute(
+                "SELECT id, workspace_id, name, client_id, active FROM projects"
+            ).fetchall()
+        return clients, projects
+
+    def upsert_clients(self, rows):
+        """Store (id, workspace_id, name) rows."""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO clients (id, workspace_id, name) VALUES (?, ?, ?)", rows
+            )
+            self.conn.commit()
+
+    def upsert_projects(self, rows):
+        """Store (id, workspace_id, name, client_id, active) rows."""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO projects (id, workspace_id, name, client_id, active) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+
+    def clear_entries(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_state_store(path=None):
+    """Open the store at path or TOGGL_STATE_DB; return None when state is disabled."""
+    path = path or os.getenv("TOGGL_STATE_DB")
+    if not path:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return StateStore(path)
@@ -1,49 +1,107 @@
+import argparse
+import hashlib
+import heapq
+import json
 import os
-from requests.auth import HTTPBasicAuth
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import pendulum
-import requests
 from .notion_helper import NotionHelper
+from .toggl_client import TogglAPIError, TogglClient
+from .state import DEFAULT_STATE_PATH, open_state_store
+from .pipeline import RunBudget, WindowPolicy, prefetch
+from .coverage import DayCoverage
+from .models import TimeEntry
 from . import utils
 
-from .config import TAG_ICON_URL
+from .config import TAG_ICON_URL, FINGERPRINT_PROPERTY
 from .utils import get_icon, split_emoji_from_string
 from dotenv import load_dotenv
 from notionhub.log import sync_notification
 load_dotenv()
 
-auth = None
+toggl_client = None
 notion_helper = None
+state_store = None
 project_cache = {}
 client_cache = {}
 project_name_cache = {}
 client_name_cache = {}
+tag_cache = {}
+# Display records (emoji, name, icon, relation properties) per project/client id
+project_display = {}
+client_display = {}
+reports_api_version = os.getenv("TOGGL_REPORTS_API", "v3").lower()
+sync_stats = {"created": 0, "updated": 0, "skipped": 0, "archived": 0}
+# Replaced in main() when --max-seconds / --max-api-calls are given
+run_budget = RunBudget()
+# Track API v9 only serves `since` change feeds for roughly the last three months
+CHANGE_FEED_MAX_AGE_DAYS = 85
+# Reports API entries are handed to the writer in batches of this size
+REPORT_BATCH_SIZE = 50
+# Projects requested per page from the workspace projects endpoint
+PROJECTS_PER_PAGE = 200
+# Days after which a recorded Reports API history limit is probed again
+HISTORICAL_LIMIT_RECHECK_DAYS = 30
+# Repair mode counts entries per day in chunks of this many days and merges
+# mismatched days separated by at most COVERAGE_MERGE_GAP_DAYS into one window
+COVERAGE_CHUNK_DAYS = 90
+COVERAGE_MERGE_GAP_DAYS = 2
+# Rows requested per Reports API v3 search page
+REPORTS_V3_PAGE_SIZE = int(os.getenv("TOGGL_REPORTS_PAGE_SIZE", "1000"))
 
-def init():
-    global auth, notion_helper
+def init(state_path=None):
+    global toggl_client, notion_helper, state_store
     notion_helper = NotionHelper()
     toggl_token = os.getenv("TOGGL_TOKEN")
     if not toggl_token:
         utils.log("❌ Missing TOGGL_TOKEN environment variable.")
         return False
-    auth = HTTPBasicAuth(f"{toggl_token}", "api_token")
+    toggl_client = TogglClient(toggl_token)
+    state_store = open_state_store(state_path)
     return True
 
 
+def rebuild_state():
+    """Repopulate the local state store from a single paged scan of the Time data source."""
+    notion_helper.ensure_time_id_property()
+    utils.log("🔁 Rebuilding local state from Notion...")
+    state_store.clear_entries()
+    count = 0
+    for page in notion_helper.iter_time_pages():
+        toggl_id, fingerprint, start, stop = notion_helper.parse_time_page(page)
+        if toggl_id is None:
+            continue
+        state_store.upsert_entry(toggl_id, page.get("id"), fingerprint, start, stop)
+        count += 1
+    utils.log(f"✅ Rebuilt local state with {count} entries.")
+
+
+def load_state(rebuild=False):
+    """Seed the in-memory page index from the state store, rebuilding it when asked or empty."""
+    if not state_store:
+        return
+    if rebuild or state_store.is_empty():
+        rebuild_state()
+    for toggl_id, page_id, fingerprint in state_store.iter_entries():
+        notion_helper.time_page_index[toggl_id] = page_id
+        if fingerprint:
+            notion_helper.time_fingerprints[toggl_id] = fingerprint
+
+
 def get_created_at():
-    response = requests.get("https://api.track.toggl.com/api/v9/me", auth=auth, timeout=15)
+    response = toggl_client.get("/api/v9/me")
     if response.ok:
-        data = response.json()
+        data = toggl_client.json(response)
         return pendulum.parse(data.get("created_at"))
     else:
         utils.log(f"Failed to get user info: {response.text}")
         return pendulum.datetime(2010, 1, 1, tz="Asia/Shanghai")
 
 def get_workspaces():
-    response = requests.get(
-        "https://api.track.toggl.com/api/v9/me/workspaces", auth=auth, timeout=15
-    )
+    response = toggl_client.get("/api/v9/me/workspaces")
     if response.ok:
-        return response.json()
+        return toggl_client.json(response)
     else:
         utils.log(f"Failed to get workspaces: {response.text}")
         return []
@@ -52,55 +110,158 @@ def normalize_cache_name(name):
     return (name or "").strip().lower()
 
 
+def display_record(name):
+    """Emoji, display name and icon of a project/client name, computed once per load."""
+    emoji, display_name = split_emoji_from_string(name)
+    return {"emoji": emoji, "name": display_name, "icon": {"type": "emoji", "emoji": emoji}}
+
+
+def get_client_display(client_id):
+    display = client_display.get(client_id)
+    if display is None and client_id in client_cache:
+        display = client_display[client_id] = display_record(client_cache[client_id])
+    return display
+
+
+def get_project_display(project_id):
+    display = project_display.get(project_id)
+    if display is None and project_id in project_cache:
+        display = project_display[project_id] = display_record(project_cache[project_id]["name"])
+    return display
+
+
+def cache_client(workspace_id, client_id, name):
+    client_cache[client_id] = name
+    client_name_cache[(workspace_id, normalize_cache_name(name))] = client_id
+    client_display[client_id] = display_record(name)
+
+
+def cache_project(workspace_id, project_id, name, client_id=None):
+    project_cache[project_id] = {
+        "name": name,
+        "client_id": client_id,
+        "workspace_id": workspace_id,
+    }
+    project_name_cache[
+        (workspace_id, normalize_cache_name(name), client_id)
+    ] = project_id
+    project_name_cache[
+        (workspace_id, normalize_cache_name(name), None)
+    ] = project_id
+    project_display[project_id] = display_record(name)
+
+
+def load_stored_workspace_meta():
+    """Seed the project/client caches from the state store with a single read."""
+    if not state_store:
+        return
+    clients, projects = state_store.load_workspace_meta()
+    for client_id, workspace_id, name in clients:
+        cache_client(workspace_id, client_id, name)
+    for project_id, workspace_id, name, client_id, _ in projects:
+        cache_project(workspace_id, project_id, name, client_id)
+    if clients or projects:
+        utils.log(f"Loaded {len(clients)} clients and {len(projects)} projects from local state")
+
+
+def fetch_workspace_projects(workspace_id, since=None):
+    """Fetch active and archived projects, following pagination; None on failure."""
+    projects = []
+    params = {"active": "both", "per_page": PROJECTS_PER_PAGE, "page": 1}
+    if since:
+        params["since"] = since
+    while True:
+        response = toggl_client.get(f"/api/v9/workspaces/{workspace_id}/projects", params=params)
+        if not response.ok:
+            utils.log(f"Failed to load projects for workspace {workspace_id}: {response.status_code} {response.text}")
+            return None
+        page = toggl_client.json(response) or []
+        projects.extend(page)
+        if len(page) < PROJECTS_PER_PAGE:
+            return projects
+        params["page"] += 1
+
+
 def load_workspace_cache(workspace_id):
-    global project_cache, client_cache, project_name_cache, client_name_cache
+    """Refresh project/client metadata for a workspace; with a state store only what changed since the last refresh."""
+    cursor_name = f"workspace_meta:{workspace_id}"
+    since = state_store.get_cursor(cursor_name) if state_store else None
+    refreshed_at = pendulum.now().subtract(minutes=1).int_timestamp
+    ok = True
+
     # Load Clients
-    response = requests.get(f"https://api.track.toggl.com/api/v9/workspaces/{workspace_id}/clients", auth=auth, timeout=15)
+    params = {"status": "both"}
+    if since:
+        params["since"] = since
+    response = toggl_client.get(f"/api/v9/workspaces/{workspace_id}/clients", params=params)
     if response.ok:
-        clients = response.json()
-        utils.log(f"Loaded {len(clients)} clients for workspace {workspace_id}")
+        clients = toggl_client.json(response) or []
+        utils.log(f"Loaded {len(clients)} {'changed ' if since else ''}clients for workspace {workspace_id}")
         for c in clients:
-            client_cache[c["id"]] = c["name"]
-            client_name_cache[(workspace_id, normalize_cache_name(c.get("name")))] = c["id"]
+            cache_client(workspace_id, c["id"], c["name"])
+        if state_store:
+            state_store.upsert_clients([(c["id"], workspace_id, c["name"]) for c in clients])
     else:
+        ok = False
         utils.log(f"Failed to load clients for workspace {workspace_id}: {response.status_code} {response.text}")
     
     # Load Projects
-    response = requests.get(f"https://api.track.toggl.com/api/v9/workspaces/{workspace_id}/projects", auth=auth, timeout=15)
-    if response.ok:
-        projects = response.json()
-        utils.log(f"Loaded {len(projects)} projects for workspace {workspace_id}")
+    projects = fetch_workspace_projects(workspace_id, since)
+    if projects is not None:
+        utils.log(f"Loaded {len(projects)} {'changed ' if since else ''}projects for workspace {workspace_id}")
         for p in projects:
-            project_cache[p["id"]] = {
-                "name": p["name"],
-                "client_id": p.get("client_id"),
-                "workspace_id": workspace_id,
-            }
-            project_name_cache[
-                (workspace_id, normalize_cache_name(p.get("name")), p.get("client_id"))
-            ] = p["id"]
-            project_name_cache[
-                (workspace_id, normalize_cache_name(p.get("name")), None)
-            ] = p["id"]
+            cache_project(workspace_id, p["id"], p["name"], p.get("client_id"))
+        if state_store:
+            state_store.upsert_projects(
+                [(p["id"], workspace_id, p["name"], p.get("client_id"), int(bool(p.get("active", True)))) for p in projects]
+            )
     else:
-        utils.log(f"Failed to load projects for workspace {workspace_id}: {response.status_code} {response.text}")
+        ok = False
+
+    if state_store and ok:
+        state_store.set_cursor(cursor_name, refreshed_at)
+
+def reconcile_relations():
+    """Rename preloaded Client/Project pages whose Id matches a Toggl object; never creates or relinks pages."""
+    client_source = notion_helper.client_data_source_id
+    project_source = notion_helper.project_data_source_id
+    notion_helper.live_remote_ids[client_source] = set(client_cache)
+    notion_helper.live_remote_ids[project_source] = set(project_cache)
+    if client_source in notion_helper.relation_index:
+        for client_id in client_cache:
+            display = get_client_display(client_id)
+            notion_helper.rename_indexed_relation(display["name"], client_source, display["icon"], client_id)
+    if project_source in notion_helper.relation_index:
+        for pid in project_cache:
+            display = get_project_display(pid)
+            notion_helper.rename_indexed_relation(display["name"], project_source, display["icon"], pid)
+
 
 def get_time_entries(start_date, end_date):
-    """Fetch raw time entries using Track API v9 (Free)"""
-    url = "https://api.track.toggl.com/api/v9/me/time_entries"
+    """Fetch time entries as TimeEntry records using Track API v9 (Free)"""
+    url = "/api/v9/me/time_entries"
     # Toggl v9 API expects ISO8601, preferably in UTC or with explicit offset
     # Using .format("YYYY-MM-DDTHH:mm:ssZ") ensures compatibility
     params = {
         "start_date": start_date.format("YYYY-MM-DDTHH:mm:ssZ"),
         "end_date": end_date.format("YYYY-MM-DDTHH:mm:ssZ"),
     }
-    response = requests.get(url, params=params, auth=auth, timeout=15)
+    response = toggl_client.get(url, params=params)
     if response.ok:
-        return response.json(), 200
+        return [TimeEntry.from_track(entry) for entry in toggl_client.json(response) or []], 200
     else:
         utils.log(f"Failed to fetch time entries ({start_date.to_date_string()} to {end_date.to_date_string()}): {response.status_code} {response.text}")
         return None, response.status_code
 
+def get_time_entries_since(since):
+    """Fetch entries created, edited or deleted since a unix timestamp (Track API v9)."""
+    response = toggl_client.get("/api/v9/me/time_entries", params={"since": int(since)})
+    if response.ok:
+        return [TimeEntry.from_track(entry) for entry in toggl_client.json(response) or []], 200
+    else:
+        utils.log(f"Failed to fetch time entry changes since {since}: {response.status_code} {response.text}")
+        return None, response.status_code
+
 def create_toggl_entry(workspace_id, description, start, duration, pid=None):
     """Create a time entry in Toggl Track."""
     data = {
@@ -113,14 +274,9 @@ def create_toggl_entry(workspace_id, description, start, duration, pid=None):
     if pid:
         data["project_id"] = int(pid)
     
-    response = requests.post(
-        f"https://api.track.toggl.com/api/v9/workspaces/{workspace_id}/time_entries",
-        auth=auth,
-        json=data,
-        timeout=15
-    )
+    response = toggl_client.post(f"/api/v9/workspaces/{workspace_id}/time_entries", json=data)
     if response.ok:
-        entry = response.json()
+        entry = toggl_client.json(response)
         utils.log(f"✅ Created Toggl entry: [{description}] (ID: {entry['id']})")
         return entry.get("id")
     else:
@@ -137,20 +293,20 @@ def create_toggl_client(workspace_id, name):
     if cache_key in client_name_cache:
         return client_name_cache[cache_key]
 
-    response = requests.post(
-        f"https://api.track.toggl.com/api/v9/workspaces/{workspace_id}/clients",
-        auth=auth,
-        json={"name": clean_name},
-        timeout=15,
+    response = toggl_client.post(
+        f"/api/v9/workspaces/{workspace_id}/clients", json={"name": clean_name}
     )
     if not response.ok:
         utils.log(f"Failed to create Toggl client '{clean_name}': {response.status_code} {response.text}")
         return None
-    client = response.json()
+    client = toggl_client.json(response)
     client_id = client.get("id")
     if client_id:
-        client_cache[client_id] = client.get("name") or clean_name
+        client_name = client.get("name") or clean_name
+        cache_client(workspace_id, client_id, client_name)
         client_name_cache[cache_key] = client_id
+        if state_store:
+            state_store.upsert_clients([(client_id, workspace_id, client_name)])
         utils.log(f"✅ Created Toggl client: [{clean_name}] (ID: {client_id})")
     return client_id
 
@@ -178,25 +334,20 @@ def create_toggl_project(workspace_id, name, client_id=None):
     }
     if client_id:
         payload["client_id"] = int(client_id)
-    response = requests.post(
-        f"https://api.track.toggl.com/api/v9/workspaces/{workspace_id}/projects",
-        auth=auth,
-        json=payload,
-        timeout=15,
-    )
+    response = toggl_client.post(f"/api/v9/workspaces/{workspace_id}/projects", json=payload)
     if not response.ok:
         utils.log(f"Failed to create Toggl project '{clean_name}': {response.status_code} {response.text}")
         return None
-    project = response.json()
+    project = toggl_client.json(response)
     project_id = project.get("id")
     if project_id:
-        project_cache[project_id] = {
-            "name": project.get("name") or clean_name,
-            "client_id": project.get("client_id") or client_id,
-            "workspace_id": workspace_id,
-        }
-        project_name_cache[(workspace_id, normalize_cache_name(clean_name), project_cache[project_id].get("client_id"))] = project_id
+        project_name = project.get("name") or clean_name
+        project_client_id = project.get("client_id") or client_id
+        cache_project(workspace_id, project_id, project_name, project_client_id)
+        project_name_cache[(workspace_id, normalize_cache_name(clean_name), project_client_id)] = project_id
         project_name_cache[fallback_key] = project_id
+        if state_store:
+            state_store.upsert_projects([(project_id, workspace_id, project_name, project_client_id, 1)])
         utils.log(f"✅ Created Toggl project: [{clean_name}] (ID: {project_id})")
     return project_id
 
@@ -204,18 +355,24 @@ def create_toggl_project(workspace_id, name, client_id=None):
 def ensure_remote_client(client_page_id, workspace_id):
     if not client_page_id:
         return None
-    remote_id = notion_helper.get_remote_id_from_page(client_page_id)
+    remote_id = notion_helper.get_relation_remote_id(notion_helper.client_data_source_id, client_page_id)
     if remote_id:
         return int(remote_id)
 
-    client_name, _ = notion_helper.get_page_title(client_page_id)
+    index = notion_helper.relation_index.get(notion_helper.client_data_source_id)
+    if index is not None and client_page_id in index["titles"]:
+        client_name = index["titles"][client_page_id]
+    else:
+        client_name, _ = notion_helper.get_page_title(client_page_id)
     if not client_name:
         utils.log(f"⚠️ Client page {client_page_id} has no title. Skipping client sync.")
         return None
 
     client_id = create_toggl_client(workspace_id, client_name)
     if client_id:
-        notion_helper.update_page(client_page_id, {"Id": {"number": int(client_id)}})
+        notion_helper.queue_update(client_page_id, {"Id": {"number": int(client_id)}})
+        if notion_helper.client_data_source_id in notion_helper.relation_index:
+            notion_helper.index_relation(notion_helper.client_data_source_id, client_page_id, client_name, client_id)
         utils.log(f"🔗 Linked Notion client '{client_name}' with Toggl ID {client_id}")
     return client_id
 
@@ -223,27 +380,164 @@ def ensure_remote_client(client_page_id, workspace_id):
 def ensure_remote_project(project_page_id, workspace_id, client_page_id_override=None):
     if not project_page_id:
         return None
-    remote_id = notion_helper.get_remote_id_from_page(project_page_id)
+    remote_id = notion_helper.get_relation_remote_id(notion_helper.project_data_source_id, project_page_id)
     if remote_id:
         return int(remote_id)
 
-    project_name, project_page = notion_helper.get_page_title(project_page_id)
+    index = notion_helper.relation_index.get(notion_helper.project_data_source_id)
+    if index is not None and project_page_id in index["titles"]:
+        project_name = index["titles"][project_page_id]
+        client_page_id = index["clients"].get(project_page_id) or client_page_id_override
+    else:
+        project_name, project_page = notion_helper.get_page_title(project_page_id)
+        client_page_id = (
+            notion_helper.get_relation_page(project_page, ["Client", "客户", "客户端"])
+            or client_page_id_override
+        )
     if not project_name:
         utils.log(f"⚠️ Project page {project_page_id} has no title. Skipping project sync.")
         return None
 
-    client_page_id = (
-        notion_helper.get_relation_page(project_page, ["Client", "客户", "客户端"])
-        or client_page_id_override
-    )
     client_id = ensure_remote_client(client_page_id, workspace_id)
     project_id = create_toggl_project(workspace_id, project_name, client_id)
     if project_id:
-        notion_helper.update_page(project_page_id, {"Id": {"number": int(project_id)}})
+        notion_helper.queue_update(project_page_id, {"Id": {"number": int(project_id)}})
+        if notion_helper.project_data_source_id in notion_helper.relation_index:
+            notion_helper.index_relation(notion_helper.project_data_source_id, project_page_id, project_name, project_id)
         utils.log(f"🔗 Linked Notion project '{project_name}' with Toggl ID {project_id}")
     return project_id
 
 
+def provision_reverse_relations(pages, workspace_id):
+    """Give every Project/Client referenced by pages a Toggl Id before any entry is created."""
+    client_pages = []
+    project_pages = {}
+    for page in pages:
+        client_page_id = notion_helper.get_relation_page(page, ["Client", "客户", "客户端"])
+        project_page_id = notion_helper.get_relation_page(page, ["Project", "项目"])
+        if client_page_id and client_page_id not in client_pages:
+            client_pages.append(client_page_id)
+        if project_page_id:
+            project_pages.setdefault(project_page_id, client_page_id)
+
+    project_index = notion_helper.relation_index.get(notion_helper.project_data_source_id)
+    if project_index is not None:
+        for project_page_id in project_pages:
+            client_page_id = project_index["clients"].get(project_page_id)
+            if client_page_id and client_page_id not in client_pages:
+                client_pages.append(client_page_id)
+
+    client_ds = notion_helper.client_data_source_id
+    project_ds = notion_helper.project_data_source_id
+    new_clients = [p for p in client_pages if not notion_helper.get_relation_remote_id(client_ds, p)]
+    new_projects = [p for p in project_pages if not notion_helper.get_relation_remote_id(project_ds, p)]
+    utils.log(
+        f"Reverse sync references {len(client_pages)} clients and {len(project_pages)} projects; "
+        f"{len(new_clients)} clients and {len(new_projects)} projects need Toggl Ids."
+    )
+    for client_page_id in new_clients:
+        ensure_remote_client(client_page_id, workspace_id)
+    for project_page_id in new_projects:
+        ensure_remote_project(project_page_id, workspace_id, client_page_id_override=project_pages[project_page_id])
+    failed = notion_helper.flush_writes()
+    if failed:
+        utils.log(f"⚠️ Failed to write Toggl Ids back to {len(failed)} Project/Client pages.")
+
+
+def plan_reverse_entry(page, fallback_workspace_id):
+    """Validate a Notion page without Toggl Id and resolve what to create for it, or return None."""
+    props = page.get("properties", {})
+    title = notion_helper.get_title_from_page(page) or "无描述"
+
+    date_prop = props.get("时间", {}).get("date", {})
+    if not date_prop or not date_prop.get("start"):
+        utils.log(f"⚠️ Skipping Notion page {page.get('id')}: missing start time.")
+        return None
+
+    start_time = date_prop.get("start")
+    end_time = date_prop.get("end")
+
+    # Calculate duration in seconds
+    start_p = pendulum.parse(start_time)
+    if end_time:
+        end_p = pendulum.parse(end_time)
+        duration = (end_p - start_p).total_seconds()
+    else:
+        utils.log(f"⚠️ Skipping Notion page {page.get('id')}: missing end time.")
+        return None
+    if duration <= 0:
+        utils.log(f"⚠️ Skipping Notion page {page.get('id')}: duration must be positive.")
+        return None
+
+    # Get Project ID from Notion relation
+    pid = None
+    workspace_id = fallback_workspace_id
+    client_page_id = notion_helper.get_relation_page(page, ["Client", "客户", "客户端"])
+    if client_page_id:
+        ensure_remote_client(client_page_id, workspace_id)
+
+    project_page_id = notion_helper.get_relation_page(page, ["Project", "项目"])
+    if project_page_id:
+        pid = ensure_remote_project(project_page_id, workspace_id, client_page_id_override=client_page_id)
+        if not pid:
+            utils.log(f"⚠️ Project in Notion for '{title}' does not have a Toggl ID. Creating without Project.")
+        elif pid in project_cache:
+            workspace_id = project_cache[pid].get("workspace_id", fallback_workspace_id)
+        else:
+            utils.log(
+                f"⚠️ Project ID {pid} not found in Toggl cache. Creating '{title}' without Project."
+            )
+            pid = None
+    else:
+        if client_page_id:
+            utils.log(f"⚠️ '{title}' has Client but no Project; Toggl time entries can only attach Client through a Project.")
+
+    return {
+        "page_id": page["id"],
+        "title": title,
+        "start": start_time,
+        "start_ts": start_p.int_timestamp,
+        "duration": duration,
+        "workspace_id": workspace_id,
+        "pid": pid,
+        "toggl_id": None,
+    }
+
+
+def load_existing_entry_keys(plans, workspace_ids):
+    """Return ({(start, description): toggl_id}, page ids whose range could not be checked) for the planned entries."""
+    existing = {}
+    failed = set()
+    chunks = []
+    for plan in sorted(plans, key=lambda plan: plan["start_ts"]):
+        if chunks and plan["start_ts"] - chunks[-1][0]["start_ts"] < COVERAGE_CHUNK_DAYS * 86400:
+            chunks[-1].append(plan)
+        else:
+            chunks.append([plan])
+    now = pendulum.now("Asia/Shanghai")
+    for chunk in chunks:
+        lower = pendulum.from_timestamp(chunk[0]["start_ts"] - 60, tz="Asia/Shanghai")
+        upper = pendulum.from_timestamp(chunk[-1]["start_ts"] + 60, tz="Asia/Shanghai")
+        entries = None
+        if (now - lower).days < CHANGE_FEED_MAX_AGE_DAYS:
+            entries, status_code = get_time_entries(lower, upper)
+        else:
+            failures = {}
+            try:
+                entries = list(iter_historical_entries(workspace_ids, lower, upper, failures))
+            except TogglAPIError:
+                entries = None
+            if failures:
+                entries = None
+        if entries is None:
+            failed.update(plan["page_id"] for plan in chunk)
+            continue
+        for entry in entries:
+            if entry.start is not None and entry.id is not None:
+                existing[(entry.start, entry.description or "")] = entry.id
+    return existing, failed
+
+
 def reverse_sync_notion_to_toggl():
     """Find entries in Notion without Toggl IDs and create them in Toggl."""
     utils.log("🔄 Checking for Notion entries to sync back to Toggl...")
@@ -259,68 +553,121 @@ def reverse_sync_notion_to_toggl():
         utils.log("Cannot perform reverse sync: No Toggl workspaces found.")
         return
     fallback_workspace_id = workspaces[0]["id"]
+    workspace_ids = [ws["id"] for ws in workspaces if ws.get("id") is not None]
+    provision_reverse_relations(missing_entries, fallback_workspace_id)
 
+    plans = []
     for page in missing_entries:
-        props = page.get("properties", {})
-        title = notion_helper.get_title_from_page(page) or "无描述"
-        
-        date_prop = props.get("时间", {}).get("date", {})
-        if not date_prop or not date_prop.get("start"):
-            utils.log(f"⚠️ Skipping Notion page {page.get('id')}: missing start time.")
-            continue
-            
-        start_time = date_prop.get("start")
-        end_time = date_prop.get("end")
-        
-        # Calculate duration in seconds
-        start_p = pendulum.parse(start_time)
-        if end_time:
-            end_p = pendulum.parse(end_time)
-            duration = (end_p - start_p).total_seconds()
-        else:
-            utils.log(f"⚠️ Skipping Notion page {page.get('id')}: missing end time.")
-            continue
-        if duration <= 0:
-            utils.log(f"⚠️ Skipping Notion page {page.get('id')}: duration must be positive.")
+        if run_budget.exhausted():
+            # Pages still without an Id are picked up again next run
+            utils.log("⏱️ Run budget reached; leaving remaining reverse sync for the next run.")
+            break
+        plan = plan_reverse_entry(page, fallback_workspace_id)
+        if plan:
+            plans.append(plan)
+    if not plans:
+        notion_helper.flush_writes()
+        return
+
+    # Idempotency: reuse Ids from the pending journal, match uncertain pages against Toggl
+    pending = state_store.load_reverse_pending() if state_store else {}
+    linked_elsewhere = set(pending) - {page["id"] for page in missing_entries}
+    if linked_elsewhere:
+        state_store.clear_reverse_pending(linked_elsewhere)
+    uncertain = []
+    for plan in plans:
+        if pending.get(plan["page_id"]):
+            plan["toggl_id"] = pending[plan["page_id"]]
+            utils.log(f"♻️ Reusing Toggl ID {plan['toggl_id']} for [{plan['title']}] from an earlier run")
+        elif not state_store or plan["page_id"] in pending:
+            uncertain.append(plan)
+    if uncertain:
+        existing, skipped = load_existing_entry_keys(uncertain, workspace_ids)
+        if skipped:
+            utils.log(f"⚠️ Could not check Toggl for {len(skipped)} entries created earlier; postponing them to the next run.")
+            plans = [plan for plan in plans if plan["page_id"] not in skipped]
+        for plan in uncertain:
+            if plan["page_id"] in skipped:
+                continue
+            plan["toggl_id"] = existing.get((plan["start_ts"], plan["title"]))
+            if plan["toggl_id"]:
+                utils.log(f"♻️ Found existing Toggl entry {plan['toggl_id']} for [{plan['title']}]")
+
+    to_create = [plan for plan in plans if not plan["toggl_id"]]
+    if to_create and state_store:
+        # Journal the attempt first so a crash after Toggl's create is detected next run
+        state_store.mark_reverse_pending([(plan["page_id"], None) for plan in to_create])
+
+    def create(plan):
+        return create_toggl_entry(plan["workspace_id"], plan["title"], plan["start"], plan["duration"], plan["pid"])
+
+    concurrency = max(1, int(os.getenv("TOGGL_WRITE_CONCURRENCY", "4")))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for plan, new_toggl_id in zip(to_create, executor.map(create, to_create)):
+            plan["toggl_id"] = new_toggl_id
+    created = [plan for plan in to_create if plan["toggl_id"]]
+    if created and state_store:
+        state_store.mark_reverse_pending([(plan["page_id"], int(plan["toggl_id"])) for plan in created])
+
+    # Write IDs back to Notion in one buffered flush
+    linked = [plan for plan in plans if plan["toggl_id"]]
+    for plan in linked:
+        notion_helper.queue_update(plan["page_id"], {"Id": {"number": int(plan["toggl_id"])}})
+    failed = notion_helper.flush_writes()
+    for plan in linked:
+        if plan["page_id"] in failed:
             continue
-            
-        # Get Project ID from Notion relation
-        pid = None
-        workspace_id = fallback_workspace_id
-        client_page_id = notion_helper.get_relation_page(page, ["Client", "客户", "客户端"])
-        if client_page_id:
-            ensure_remote_client(client_page_id, workspace_id)
+        # Register the page so forward sync updates it instead of creating a second one
+        toggl_id = int(plan["toggl_id"])
+        notion_helper.time_page_index[toggl_id] = plan["page_id"]
+        if state_store:
+            state_store.upsert_entry(
+                toggl_id, plan["page_id"], None, plan["start_ts"], plan["start_ts"] + int(plan["duration"])
+            )
+        utils.log(f"🔗 Linked Notion page {plan['page_id']} with Toggl ID {toggl_id}")
+    if failed:
+        utils.log("Failed to update Notion with some new Toggl IDs; they will be linked next run.")
+    if state_store:
+        state_store.clear_reverse_pending([plan["page_id"] for plan in linked if plan["page_id"] not in failed])
 
-        project_page_id = notion_helper.get_relation_page(page, ["Project", "项目"])
-        if project_page_id:
-            pid = ensure_remote_project(project_page_id, workspace_id, client_page_id_override=client_page_id)
-            if not pid:
-                utils.log(f"⚠️ Project in Notion for '{title}' does not have a Toggl ID. Creating without Project.")
-            elif pid in project_cache:
-                workspace_id = project_cache[pid].get("workspace_id", fallback_workspace_id)
-            else:
-                utils.log(
-                    f"⚠️ Project ID {pid} not found in Toggl cache. Creating '{title}' without Project."
-                )
-                pid = None
-        else:
-            if client_page_id:
-                utils.log(f"⚠️ '{title}' has Client but no Project; Toggl time entries can only attach Client through a Project.")
+def entry_stop(task):
+    """Stop time of an entry in Asia/Shanghai; running entries stop "now"."""
+    return pendulum.from_timestamp(task.stop_or_now(), tz="Asia/Shanghai")
 
-        # Create in Toggl
-        new_toggl_id = create_toggl_entry(workspace_id, title, start_time, duration, pid)
-        
-        # Write ID back to Notion
-        if new_toggl_id:
-            try:
-                notion_helper.update_page(page["id"], {"Id": {"number": int(new_toggl_id)}})
-                utils.log(f"🔗 Linked Notion page {page['id']} with Toggl ID {new_toggl_id}")
-            except Exception as e:
-                utils.log(f"Failed to update Notion with new Toggl ID: {e}")
 
-def process_entry(task):
+def entry_fingerprint(task):
+    """Stable hash of every field process_entry writes to Notion."""
+    pid = task.project_id
+    project_info = project_cache.get(pid, {}) if pid else {}
+    client_id = project_info.get("client_id")
+    payload = {
+        "description": task.description or "",
+        "start": task.start,
+        "stop": task.stop_or_now(),
+        "tags": sorted(task.tags),
+        "project": [pid, project_info.get("name")],
+        "client": [client_id, client_cache.get(client_id)],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def log_sync_stats():
+    utils.log(
+        f"📊 Sync summary: {sync_stats['created']} created, "
+        f"{sync_stats['updated']} updated, {sync_stats['skipped']} unchanged (skipped), "
+        f"{sync_stats['archived']} archived"
+    )
+    for governor in (toggl_client.governor, notion_helper.rate_governor):
+        utils.log(
+            f"⏳ {governor.name}: {governor.calls} calls, {governor.throttled} throttled, "
+            f"{governor.total_wait:.1f}s spent waiting on rate limits"
+        )
+
+
+def process_entry(task, fingerprint=None):
     item = {}
-    tags = task.get("tags")
+    tags = task.tags
     if tags:
         item["标签"] = [
             notion_helper.get_relation_id(
@@ -329,50 +676,51 @@ def process_entry(task):
             for tag in tags
         ]
     
-    item["Id"] = task.get("id")
+    item["Id"] = task.id
     
-    start = pendulum.parse(task.get("start"))
-    stop = pendulum.parse(task.get("stop") or task.get("end") or pendulum.now().to_iso8601_string())
-    start_ts = start.in_timezone("Asia/Shanghai").int_timestamp
-    stop_ts = stop.in_timezone("Asia/Shanghai").int_timestamp
+    start_ts = task.start
+    stop_ts = task.stop_or_now()
     item["时间"] = {"start": start_ts, "end": stop_ts}
     
-    pid = task.get("project_id") or task.get("pid")
-    description = task.get("description")
+    pid = task.project_id
+    description = task.description
     emoji = None
 
     if pid and pid in project_cache:
         project_info = project_cache[pid]
-        raw_project_name = project_info["name"]
-        emoji, project_display_name = split_emoji_from_string(raw_project_name)
+        display = get_project_display(pid)
+        emoji = display["emoji"]
         
         # 标注展示规则：有描述显描述，没描述显项目名
-        item["标题"] = description if description else project_display_name
+        item["标题"] = description if description else display["name"]
         
         client_id = project_info.get("client_id")
-        project_properties = {"金币":{"number": 1}}
-        
-        if client_id and client_id in client_cache:
-            client_name = client_cache[client_id]
-            client_emoji, client_name = split_emoji_from_string(client_name)
-            item["Client"] = [
-                notion_helper.get_relation_id(
-                    client_name,
-                    notion_helper.client_data_source_id,
-                    {"type": "emoji", "emoji": client_emoji},
-                    remote_id=client_id
-                )
-            ]
-            project_properties["Client"] = {
-                "relation": [{"id": id} for id in item.get("Client")]
-            }
+        client = get_client_display(client_id) if client_id else None
+        client_page_id = None
+        if client:
+            client_page_id = notion_helper.get_relation_id(
+                client["name"],
+                notion_helper.client_data_source_id,
+                client["icon"],
+                remote_id=client_id
+            )
+            item["Client"] = [client_page_id]
+
+        # Relation properties are rebuilt only when the project's Client page changes
+        if "properties" not in display or display.get("client_page_id") != client_page_id:
+            project_properties = {"金币": {"number": 1}}
+            if client_page_id:
+                project_properties["Client"] = {"relation": [{"id": client_page_id}]}
+            display["properties"] = project_properties
+            display["client_page_id"] = client_page_id
             
         item["Project"] = [
             notion_helper.get_relation_id(
-                project_display_name,
+                display["name"],
                 notion_helper.project_data_source_id,
-                {"type": "emoji", "emoji": emoji} if emoji else None,
-                properties=project_properties,
+                display["icon"] if emoji else None,
+                # get_relation_id adds title/Id keys to what it is given
+                properties=dict(display["properties"]),
                 remote_id=pid
             )
         ]
@@ -383,6 +731,8 @@ def process_entry(task):
         
     if description:
         item["备注"] = description
+    if fingerprint and FINGERPRINT_PROPERTY in notion_helper.time_props:
+        item[FINGERPRINT_PROPERTY] = fingerprint
         
     properties = notion_helper.build_properties(notion_helper.time_data_source_id, item, mandatory_properties=["标题", "Id"])
     parent = {
@@ -400,11 +750,102 @@ def process_entry(task):
     return parent, properties, icon
 
 
-import time
+def transform_report_entry(entry):
+    """Build a TimeEntry from a Reports API v2 row."""
+    # Populate cache with names from report if available (Optimization)
+    pid = entry.get("pid")
+    if pid and entry.get("project") and pid not in project_cache:
+        # project_cache structure is {"name": ..., "client_id": ...}; the report has no client_id
+        project_cache[pid] = {"name": entry.get("project")}
+    return TimeEntry.from_report_v2(entry)
+
+
+def load_workspace_tags(workspace_id, refresh=False):
+    """Return {tag_id: name} for a workspace, fetched once per run (v3 reports only return tag ids)."""
+    if refresh or workspace_id not in tag_cache:
+        response = toggl_client.get(f"/api/v9/workspaces/{workspace_id}/tags")
+        if not response.ok:
+            # Not cached, so the next window asks again instead of naming tags after their ids
+            utils.log(f"Failed to load tags for workspace {workspace_id}: {response.status_code} {response.text}")
+            raise TogglAPIError(response.status_code, response.text)
+        tag_cache[workspace_id] = {t["id"]: t["name"] for t in toggl_client.json(response) or []}
+    return tag_cache[workspace_id]
+
+
+def resolve_tag_names(workspace_id, tag_names, tag_ids):
+    """Return tag_names, reloaded once if tag_ids holds tags created since it was fetched."""
+    if all(tag_id in tag_names for tag_id in tag_ids):
+        return tag_names
+    tag_names = load_workspace_tags(workspace_id, refresh=True)
+    missing = [tag_id for tag_id in tag_ids if tag_id not in tag_names]
+    if missing:
+        utils.log(f"Unknown tag ids {missing} in workspace {workspace_id}")
+        raise TogglAPIError(500, f"unknown tag ids {missing}")
+    return tag_names
+
+
+def iter_detailed_report_v3(workspace_id, start_date, end_date):
+    """Yield entries from Reports API v3 detailed search, newest first."""
+    url = f"/reports/api/v3/workspace/{workspace_id}/search/time_entries"
+    tag_names = load_workspace_tags(workspace_id)
+    body = {
+        "start_date": start_date.to_date_string(),
+        "end_date": end_date.to_date_string(),
+        "page_size": REPORTS_V3_PAGE_SIZE,
+        "order_by": "date",
+        "order_dir": "DESC",
+        "grouped": False,
+    }
+    page = 1
+    while True:
+        try:
+            # A search only reads, so it can be retried like a GET
+            response = toggl_client.post(url, json=body, idempotent=True)
+        except Exception as e:
+            utils.log(f"Exception during report fetch: {e}")
+            raise TogglAPIError(500, str(e))
+        if not response.ok:
+            utils.log(f"Failed to fetch detailed report (v3): {response.status_code} {response.text}")
+            raise TogglAPIError(response.status_code, response.text)
+
+        rows = toggl_client.json(response) or []
+        count = 0
+        for row in rows:
+            tag_names = resolve_tag_names(workspace_id, tag_names, row.get("tag_ids") or [])
+            entries = [TimeEntry.from_report_v3(row, te, tag_names) for te in row.get("time_entries") or []]
+            entries.sort(key=lambda entry: entry.start, reverse=True)
+            count += len(entries)
+            yield from entries
+        utils.log(f"Fetched page {page} ({count} entries)...")
+
+        next_row = response.headers.get("X-Next-Row-Number")
+        if not next_row or not rows:
+            break
+        body["first_row_number"] = int(next_row)
+        page += 1
+
 
-def get_detailed_report(workspace_id, start_date, end_date):
-    """Fetch detailed report from Toggl Reports API (supports >90 days)."""
-    url = "https://api.track.toggl.com/reports/api/v2/details"
+def iter_detailed_report(workspace_id, start_date, end_date):
+    """Yield Reports API entries newest first from TOGGL_REPORTS_API, falling back from v3 to v2."""
+    global reports_api_version
+    if reports_api_version == "v3":
+        started = False
+        try:
+            for entry in iter_detailed_report_v3(workspace_id, start_date, end_date):
+                started = True
+                yield entry
+            return
+        except TogglAPIError as e:
+            if started or e.status_code not in (404, 410):
+                raise
+            utils.log(f"⚠️ Reports API v3 unavailable ({e.status_code}), falling back to v2.")
+            reports_api_version = "v2"
+    yield from iter_detailed_report_v2(workspace_id, start_date, end_date)
+
+
+def iter_detailed_report_v2(workspace_id, start_date, end_date):
+    """Yield entries from the legacy Reports API v2 details endpoint, 50 rows per page."""
+    url = "/reports/api/v2/details"
     headers = {"Content-Type": "application/json"}
     
     # Reports API requires a user_agent
@@ -413,120 +854,197 @@ def get_detailed_report(workspace_id, start_date, end_date):
         "since": start_date.to_date_string(),
         "until": end_date.to_date_string(),
         "user_agent": "toggl2notion",
+        "order_field": "date",
+        "order_desc": "on",
         "page": 1
     }
     
-    all_entries = []
-    rate_limit_retries = 0
-    max_rate_limit_retries = 10
     while True:
         try:
-            response = requests.get(url, params=params, auth=auth, headers=headers, timeout=15)
-            if response.status_code == 429:
-                rate_limit_retries += 1
-                if rate_limit_retries > max_rate_limit_retries:
-                    utils.log(f"⚠️ Reports API rate limit 连续 {max_rate_limit_retries} 次，放弃重试")
-                    return None, 429
-                utils.log(f"⚠️ Reports API rate limit hit ({rate_limit_retries}/{max_rate_limit_retries}). Sleeping for 2 seconds...")
-                time.sleep(2)
-                continue
-                
-            if not response.ok:
-                utils.log(f"Failed to fetch detailed report: {response.status_code} {response.text}")
-                return None, response.status_code
-            
-            data = response.json()
-            entries = data.get("data", [])
-            all_entries.extend(entries)
-            
-            utils.log(f"Fetched page {params['page']} ({len(entries)} entries)...")
-            
-            if len(entries) < data.get("per_page", 50):
-                break
-                
-            params["page"] += 1
-            time.sleep(1.1)  # Rate limiting (conservative)
-            
+            # 429s are retried inside TogglClient, honouring Retry-After
+            response = toggl_client.get(url, params=params, headers=headers)
         except Exception as e:
             utils.log(f"Exception during report fetch: {e}")
-            return None, 500
-            
-    # Transform to match Time Entries API format
-    transformed_entries = []
-    for entry in all_entries:
-        # Map Reports API fields to Time Entries API fields
-        transformed = {
-            "id": entry.get("id"),
-            "description": entry.get("description"),
-            "start": entry.get("start"),
-            "stop": entry.get("end"), # Report API uses 'end'
-            "duration": entry.get("dur") / 1000, # Report API uses milliseconds
-            "tags": entry.get("tags", []),
-            "pid": entry.get("pid"), # Project ID
-            "project_id": entry.get("pid"), # Keep consistency
-            "project": entry.get("project"), # Project Name (Bonus: Reports API gives name!)
-            "client": entry.get("client"),   # Client Name (Bonus!)
-            # 'project_hex_color': entry.get('project_hex_color')
-        }
-        
-        # Populate cache with names from report if available (Optimization)
-        if entry.get("pid"):
-            parsed_project_name = entry.get("project")
-            # If names are avail, update cache to avoid lookups
-            if parsed_project_name:
-                 # Note: project_cache structure is {"name": ..., "client_id": ...}
-                 # We might miss client_id here if not careful, but name is key
-                 if entry.get("pid") not in project_cache:
-                      project_cache[entry.get("pid")] = {"name": parsed_project_name}
+            raise TogglAPIError(500, str(e))
+        if response.status_code == 429:
+            utils.log("⚠️ Reports API rate limit persisted after retries, giving up")
+            raise TogglAPIError(429, response.text)
+
+        if not response.ok:
+            utils.log(f"Failed to fetch detailed report: {response.status_code} {response.text}")
+            raise TogglAPIError(response.status_code, response.text)
         
-        transformed_entries.append(transformed)
+        data = toggl_client.json(response)
+        entries = data.get("data", [])
+        utils.log(f"Fetched page {params['page']} ({len(entries)} entries)...")
+        for entry in entries:
+            yield transform_report_entry(entry)
         
-    return transformed_entries, 200
+        if len(entries) < data.get("per_page", 50):
+            break
+            
+        params["page"] += 1
+
 
+def iter_workspace_report(workspace_id, start_date, end_date, failures):
+    """Stream one workspace's report, recording a failure instead of raising it."""
+    utils.log(f"Fetching historical entries for workspace {workspace_id}...")
+    try:
+        yield from iter_detailed_report(workspace_id, start_date, end_date)
+    except TogglAPIError as e:
+        utils.log(f"⚠️ Workspace {workspace_id} failed with {e.status_code}; keeping entries from other workspaces.")
+        failures[workspace_id] = e.status_code
 
-def get_historical_entries(workspace_ids, start_date, end_date):
-    """Fetch historical entries across all workspaces via Reports API."""
-    all_entries = []
+
+def iter_historical_entries(workspace_ids, start_date, end_date, failures=None):
+    """Yield entries of every workspace newest first; failed workspaces are recorded in failures."""
+    failures = {} if failures is None else failures
+    streams = [
+        iter_workspace_report(workspace_id, start_date, end_date, failures)
+        for workspace_id in workspace_ids
+    ]
+    if len(streams) > 1:
+        streams = [prefetch(stream, depth=REPORT_BATCH_SIZE) for stream in streams]
     seen_ids = set()
+    merged = heapq.merge(*streams, key=lambda entry: entry.start, reverse=True)
+    for entry in merged:
+        dedupe_key = entry.dedupe_key
+        if dedupe_key in seen_ids:
+            continue
+        seen_ids.add(dedupe_key)
+        yield entry
+    if workspace_ids and len(failures) == len(workspace_ids):
+        raise TogglAPIError(next(iter(failures.values())), "all workspaces failed")
 
-    for workspace_id in workspace_ids:
-        utils.log(f"Fetching historical entries for workspace {workspace_id}...")
-        entries, status_code = get_detailed_report(workspace_id, start_date, end_date)
-        if status_code != 200:
-            return None, status_code
-
-        for entry in entries or []:
-            entry_id = entry.get("id")
-            dedupe_key = entry_id if entry_id is not None else (
-                workspace_id,
-                entry.get("start"),
-                entry.get("description"),
-            )
-            if dedupe_key in seen_ids:
-                continue
-            seen_ids.add(dedupe_key)
-            all_entries.append(entry)
 
-    return all_entries, 200
+def write_entries(entries, progress=None, calendar_window=None):
+    """Write entries to Notion and return how many failed."""
+    changed = []
+    errors = 0
+    for task in entries:
+        if task.deleted:
+            continue
+
+        toggl_id = task.id
+        existing_page_id = notion_helper.time_page_index.get(toggl_id)
+        try:
+            fingerprint = entry_fingerprint(task)
+        except Exception as e:
+            utils.log(f"Error processing task {task.id}: {e}")
+            errors += 1
+            continue
+        if existing_page_id and notion_helper.time_fingerprints.get(toggl_id) == fingerprint:
+            sync_stats["skipped"] += 1
+            continue
+        changed.append((task, toggl_id, existing_page_id, fingerprint))
 
+    # Resolve every 年/月/周/日 page this batch needs up front, in bulk
+    try:
+        notion_helper.prepare_calendar(
+            [entry_stop(task) for task, _, _, _ in changed], window=calendar_window
+        )
+    except Exception as e:
+        utils.log(f"⚠️ Failed to prepare calendar pages, falling back to per-entry lookups: {e}")
 
-def sync_data_range(start_date, end_date, workspace_ids, force_reports_api=False, progress=None):
-    """Sync data for a specific date range."""
-    notion_helper.ensure_time_id_property()
-    utils.log(f"Synchronizing from {start_date.to_iso8601_string()} to {end_date.to_iso8601_string()}")
-    
+    pending = []
+    jobs = []
+    for task, toggl_id, existing_page_id, fingerprint in changed:
+        description_display = task.description or '无描述'
+        try:
+            action = "Updating" if existing_page_id else "Syncing"
+            utils.log(f"📝 {action}: [{description_display}] ({task.start_iso()})")
+            parent, properties, icon = process_entry(task, fingerprint=fingerprint)
+        except Exception as e:
+            utils.log(f"Error processing task {task.id}: {e}")
+            errors += 1
+            continue
+
+        if existing_page_id:
+            # Fold in any buffered patch for this page so it is written once
+            properties, icon = notion_helper.take_pending(existing_page_id, properties, icon)
+            job = partial(notion_helper.update_page, page_id=existing_page_id, properties=properties, icon=icon)
+        else:
+            job = partial(notion_helper.create_page, parent=parent, properties=properties, icon=icon)
+        pending.append((task, toggl_id, existing_page_id, description_display, fingerprint))
+        jobs.append(job)
+
+    for (task, toggl_id, existing_page_id, description_display, fingerprint), (page, error) in zip(
+        pending, notion_helper.run_writes(jobs)
+    ):
+        if error and existing_page_id and state_store and getattr(error, "status", None) == 404:
+            # The stored page was deleted in Notion; recreate it rather than failing forever
+            utils.log(f"⚠️ Page for task {toggl_id} no longer exists in Notion. Recreating...")
+            existing_page_id = None
+            try:
+                parent, properties, icon = process_entry(task, fingerprint=fingerprint)
+                page, error = notion_helper.create_page(parent=parent, properties=properties, icon=icon), None
+            except Exception as e:
+                error = e
+        if error:
+            utils.log(f"Error processing task {task.id}: {error}")
+            errors += 1
+            continue
+        if existing_page_id:
+            page_id = existing_page_id
+            sync_stats["updated"] += 1
+        else:
+            page_id = page.get("id")
+            notion_helper.time_page_index[toggl_id] = page_id
+            sync_stats["created"] += 1
+        notion_helper.time_fingerprints[toggl_id] = fingerprint
+        if state_store:
+            state_store.upsert_entry(toggl_id, page_id, fingerprint, task.start, task.stop)
+        if progress:
+            status = "已更新" if existing_page_id else "已新增"
+            progress.add(description_display, page_id=page_id, status=status)
+    return errors
+
+
+# Window item statuses yielded by fetch_windows
+WINDOW_MORE = "more"        # a batch; more batches of this window follow
+WINDOW_DONE = "done"        # last batch of a fully fetched window
+WINDOW_PARTIAL = "partial"  # last batch, but some workspace failed
+WINDOW_FAILED = "failed"    # fatal API status; nothing follows
+
+
+def fetch_windows(start_date, end_date, workspace_ids, force_reports_api=False, journal=None):
+    """Yield (window_start, window_end, entries, status) batches, newest window first."""
+    policies = {
+        # Track v9 returns a window in one unpaged response
+        "track": WindowPolicy("track", initial_days=10, min_days=1, max_days=30, target_entries=300, limit_entries=900),
+        # Reports v2 pages 50 rows per request (v3 far more); aim for ~10 v2 pages per window
+        "reports": WindowPolicy("reports", initial_days=10, min_days=1, max_days=90, target_entries=500, limit_entries=2000),
+    }
     current_end = end_date
     while current_end > start_date:
-        current_start = current_end.subtract(days=10)
+        if run_budget.exhausted():
+            return # sync_data_range reports the stop
+        if journal and state_store:
+            resume_ts = state_store.resume_point(journal, current_end.int_timestamp)
+            if resume_ts < current_end.int_timestamp:
+                resumed = pendulum.from_timestamp(resume_ts, tz="Asia/Shanghai")
+                utils.log(f"⏭️ Skipping journaled windows {resumed.to_date_string()} ~ {current_end.to_date_string()}")
+                current_end = resumed
+                if current_end <= start_date:
+                    break
+
+        # Check if we are clearly out of 90 days range? 
+        now = pendulum.now("Asia/Shanghai")
+        days_diff = (now - current_end).days
+        use_reports_api = force_reports_api or (days_diff > 85)
+
+        policy = policies["reports" if use_reports_api else "track"]
+        current_start = current_end.subtract(days=policy.days)
+        if not use_reports_api:
+            # Keep Track API windows inside its ~90 day lookback
+            current_start = max(current_start, now.subtract(days=89))
         if current_start < start_date:
             current_start = start_date
             
         entries = None
         status_code = 200
-        
-        # Check if we are clearly out of 90 days range? 
-        days_diff = (pendulum.now("Asia/Shanghai") - current_end).days
-        use_reports_api = force_reports_api or (days_diff > 85)
+        calls_before = toggl_client.governor.calls
+        status = WINDOW_DONE
         
         if not use_reports_api:
             entries, status_code = get_time_entries(current_start, current_end)
@@ -536,64 +1054,223 @@ def sync_data_range(start_date, end_date, workspace_ids, force_reports_api=False
                  status_code = 200 # Reset for retry
             elif status_code == 402:
                  utils.log(f"🛑 Hit Toggl API limit (402). Stopping.")
-                 return False # Stop sync
+                 yield current_start, current_end, None, WINDOW_FAILED
+                 return # Stop sync
+            elif status_code != 200:
+                 # Never report an unread window as done, or cursors and the journal skip it
+                 utils.log(f"🛑 Track API failed with {status_code}. Stopping sync for this chunk.")
+                 yield current_start, current_end, None, WINDOW_FAILED
+                 return
 
         if use_reports_api:
-            entries, status_code = get_historical_entries(workspace_ids, current_start, current_end)
-            
-            if status_code == 402:
-                # Special handling for Free Tier limit on historical reports
-                utils.log(f"🛑 Payment Required (402) for range {current_start.to_date_string()} - {current_end.to_date_string()}.")
-                utils.log(f"⚠️ Likely reached the limit of historical data access for Free Plan (approx 1 year).")
-                utils.log(f"🛑 Stoping backfill to avoid further errors.")
-                return False # Stop sync completely for deeper history
-            
-            if status_code != 200:
-                utils.log(f"🛑 Reports API failed with {status_code}. Stopping sync for this chunk.")
-                return False
-
-        if entries:
-            utils.log(f"Found {len(entries)} entries from {current_start.to_date_string()} to {current_end.to_date_string()}. Processing...")
-            # Sort newest first
-            entries.sort(key=lambda x: pendulum.parse(x['start']), reverse=True)
-            
-            for task in entries:
-                if task.get("server_deleted_at"):
+            policy = policies["reports"]
+            # Stream the report in page-sized batches so memory stays bounded
+            batch = []
+            count = 0
+            failures = {}
+            try:
+                for entry in iter_historical_entries(workspace_ids, current_start, current_end, failures):
+                    count += 1
+                    batch.append(entry)
+                    if len(batch) >= REPORT_BATCH_SIZE:
+                        yield current_start, current_end, batch, WINDOW_MORE
+                        batch = []
+            except TogglAPIError as e:
+                window_days = max(1, (current_end - current_start).days)
+                if e.status_code == 402 and not count and window_days > policy.min_days:
+                    # The plan's history limit lies inside this window; narrow it down before recording it
+                    policy.days = max(policy.min_days, window_days // 2)
+                    utils.log(f"⚠️ Payment Required (402) for {window_days}d window; retrying with {policy.days}d.")
                     continue
-                
-                toggl_id = task.get('id')
-                existing_page_id = notion_helper.get_page_by_toggl_id(toggl_id)
-                
-                description_display = task.get('description') or '无描述'
-                action = "Updating" if existing_page_id else "Syncing"
-                
-                utils.log(f"📝 {action}: [{description_display}] ({task.get('start')})")
-                
-                try:
-                    parent, properties, icon = process_entry(task)
-                    if existing_page_id:
-                        notion_helper.update_page(page_id=existing_page_id, properties=properties, icon=icon)
-                        page_id = existing_page_id
-                    else:
-                        page = notion_helper.create_page(parent=parent, properties=properties, icon=icon)
-                        page_id = page.get("id")
-                    if progress:
-                        status = "已更新" if existing_page_id else "已新增"
-                        progress.add(description_display, page_id=page_id, status=status)
-                except Exception as e:
-                    utils.log(f"Error processing task {task.get('id')}: {e}")
-        
+                if batch:
+                    yield current_start, current_end, batch, WINDOW_MORE
+                if e.status_code == 402:
+                    # Special handling for Free Tier limit on historical reports
+                    utils.log(f"🛑 Payment Required (402) for range {current_start.to_date_string()} - {current_end.to_date_string()}.")
+                    utils.log(f"⚠️ Likely reached the limit of historical data access for Free Plan (approx 1 year).")
+                    utils.log(f"🛑 Stoping backfill to avoid further errors.")
+                    # Entries already streamed show the window's top is readable
+                    record_historical_limit(current_start if count else current_end)
+                else:
+                    utils.log(f"🛑 Reports API failed with {e.status_code}. Stopping sync for this chunk.")
+                yield current_start, current_end, None, WINDOW_FAILED
+                return # Stop sync completely for deeper history
+            if failures:
+                status = WINDOW_PARTIAL
+        else:
+            count = len(entries or [])
+            batch = entries or []
+            if batch:
+                # Sort newest first
+                batch.sort(key=lambda x: x.start, reverse=True)
+            # Hand Track windows over in batches too, so the run budget is checked between them
+            while len(batch) > REPORT_BATCH_SIZE:
+                yield current_start, current_end, batch[:REPORT_BATCH_SIZE], WINDOW_MORE
+                batch = batch[REPORT_BATCH_SIZE:]
+
+        window_days = max(1, (current_end - current_start).days)
+        next_days = policy.observe(window_days, count)
+        utils.log(
+            f"🪟 Window {current_start.to_date_string()} ~ {current_end.to_date_string()} "
+            f"({window_days}d, {policy.name}): {count} entries, "
+            f"{toggl_client.governor.calls - calls_before} Toggl calls; next window {next_days}d"
+        )
+        yield current_start, current_end, batch, status
+
         if current_start <= start_date:
             break
         
         # Prepare for next iteration
         current_end = current_start.subtract(seconds=1)
+
+
+def sync_data_range(start_date, end_date, workspace_ids, force_reports_api=False, progress=None, journal=None):
+    """Sync data for a specific date range; returns False unless every window was fully synced."""
+    notion_helper.ensure_time_id_property()
+    utils.log(f"Synchronizing from {start_date.to_iso8601_string()} to {end_date.to_iso8601_string()}")
+
+    depth = int(os.getenv("TOGGL_PREFETCH_WINDOWS", "1"))
+    windows = prefetch(
+        fetch_windows(start_date, end_date, workspace_ids, force_reports_api, journal=journal), depth=depth
+    )
+    indexed_window = None
+    seen_windows = set()
+    calls_before = toggl_client.governor.calls
+    window_entries = 0
+    window_errors = 0
+    incomplete_windows = 0
+    for current_start, current_end, entries, status in windows:
+        seen_windows.add((current_start, current_end))
+        if status == WINDOW_FAILED:
+            log_window_stats(len(seen_windows), toggl_client.governor.calls - calls_before)
+            return False # Stop sync
+
+        if entries:
+            utils.log(f"Found {len(entries)} entries from {current_start.to_date_string()} to {current_end.to_date_string()}. Processing...")
+
+            # One paged query per window instead of one lookup per entry.
+            # Pad by a day so entries crossing the window edge are still found.
+            # With a local state store the index is already complete.
+            if indexed_window != (current_start, current_end):
+                indexed_window = (current_start, current_end)
+                if not state_store:
+                    indexed = notion_helper.index_time_pages(
+                        current_start.subtract(days=1), current_end.add(days=1)
+                    )
+                    utils.log(f"Indexed {indexed} existing Notion pages for this window.")
+
+            # Calendar pages are loaded for the whole window, not per batch
+            calendar_window = (
+                current_start.in_timezone("Asia/Shanghai"),
+                current_end.in_timezone("Asia/Shanghai").add(days=1),
+            )
+            window_entries += len(entries)
+            window_errors += write_entries(entries, progress=progress, calendar_window=calendar_window)
+
+        if status != WINDOW_MORE:
+            window_errors += len(notion_helper.flush_writes())
+            complete = status == WINDOW_DONE and not window_errors
+            if not complete:
+                incomplete_windows += 1
+            if journal and state_store:
+                state_store.record_window(
+                    journal,
+                    current_start.int_timestamp,
+                    current_end.int_timestamp,
+                    window_entries,
+                    "complete" if complete else "incomplete",
+                )
+            window_entries = 0
+            window_errors = 0
+
+        if run_budget.exhausted():
+            # An unfinished window is not journaled, so the next run redoes it
+            windows.close()
+            break
         
+    log_window_stats(len(seen_windows), toggl_client.governor.calls - calls_before)
+    if run_budget.exhausted():
+        utils.log(f"⏱️ Run budget reached ({run_budget.describe()}); stopping before {end_date.to_date_string()} range is finished.")
+        return False
+    if incomplete_windows:
+        # A failed workspace or write must not let the caller move its cursor past these entries
+        utils.log(f"⚠️ {incomplete_windows} windows were only partly synced; cursors stay put so they are retried.")
+        return False
     return True
 
-def insert_to_notion(progress=None):
+
+def record_historical_limit(limit_end):
+    """Remember how far back the Reports API allows, so later runs stop probing past it."""
+    if not state_store:
+        return
     now = pendulum.now("Asia/Shanghai")
-    
+    state_store.set_cursor("historical_limit_days", (now - limit_end).days)
+    state_store.set_cursor("historical_limit_checked", now.int_timestamp)
+
+
+def get_historical_floor():
+    """Oldest date the Reports API is known to serve, or None when unknown or due for a recheck."""
+    if not state_store:
+        return None
+    limit_days = state_store.get_cursor("historical_limit_days")
+    checked = state_store.get_cursor("historical_limit_checked")
+    if limit_days is None or checked is None:
+        return None
+    now = pendulum.now("Asia/Shanghai")
+    if (now.int_timestamp - int(checked)) > HISTORICAL_LIMIT_RECHECK_DAYS * 86400:
+        return None
+    return now.subtract(days=int(limit_days) - 1)
+
+
+def log_window_stats(window_count, toggl_calls):
+    utils.log(f"🪟 Range covered in {window_count} windows using {toggl_calls} Toggl calls")
+
+def archive_entry(toggl_id, page_id, label):
+    """Archive the page of an entry deleted in Toggl and forget it locally; False on failure."""
+    try:
+        notion_helper.archive_page(page_id)
+    except Exception as e:
+        utils.log(f"Error archiving page for task {toggl_id}: {e}")
+        return False
+    notion_helper.time_page_index.pop(toggl_id, None)
+    notion_helper.time_fingerprints.pop(toggl_id, None)
+    if state_store:
+        state_store.delete_entry(toggl_id)
+    sync_stats["archived"] += 1
+    utils.log(f"🗑️ Archived Notion page for deleted entry [{label}]")
+    return True
+
+
+def sync_changes(since, progress=None):
+    """Apply every Toggl change since the cursor; returns False when any change was not applied."""
+    notion_helper.ensure_time_id_property()
+    utils.log(f"🔄 Fetching Toggl changes since {pendulum.from_timestamp(since, tz='Asia/Shanghai').to_datetime_string()}")
+    entries, status_code = get_time_entries_since(since)
+    if status_code != 200:
+        return False
+
+    deleted = [entry for entry in entries if entry.deleted]
+    changed = [entry for entry in entries if not entry.deleted]
+    utils.log(f"Found {len(changed)} changed and {len(deleted)} deleted entries.")
+
+    errors = 0
+    for entry in deleted:
+        page_id = notion_helper.time_page_index.get(entry.id)
+        if page_id and not archive_entry(entry.id, page_id, entry.description or "无描述"):
+            errors += 1
+
+    if changed:
+        changed.sort(key=lambda x: x.start, reverse=True)
+        errors += write_entries(changed, progress=progress)
+    errors += len(notion_helper.flush_writes())
+    if errors:
+        utils.log(f"⚠️ {errors} changes failed to apply; keeping the change cursor to retry them next run.")
+        return False
+    return True
+
+
+def get_notion_anchors():
+    """Return (latest_end, earliest_start) of the Time data source via two sorted queries."""
     # 1. Check latest entry in Notion (Forward Sync Anchor)
     sorts_desc = [{"property": "时间", "direction": "descending"}]
     response = notion_helper.query(
@@ -625,64 +1302,324 @@ def insert_to_notion(progress=None):
             earliest_start = pendulum.parse(date_prop_early.get("start")).in_timezone("Asia/Shanghai")
             utils.log(f"🔍 Found earliest entry in Notion: {date_prop_early.get('start')}")
 
+    return latest_end, earliest_start
+
+
+def get_state_anchors():
+    """Return (latest_end, earliest_start) from the local state store without querying Notion."""
+    earliest_ts, latest_ts = state_store.bounds()
+    latest_end = pendulum.from_timestamp(latest_ts, tz="Asia/Shanghai") if latest_ts else None
+    forward_cursor = state_store.get_cursor("forward")
+    if forward_cursor:
+        cursor = pendulum.parse(forward_cursor).in_timezone("Asia/Shanghai")
+        latest_end = max(latest_end, cursor) if latest_end else cursor
+    earliest_start = pendulum.from_timestamp(earliest_ts, tz="Asia/Shanghai") if earliest_ts else None
+    if earliest_start:
+        utils.log(f"🔍 Found earliest entry in local state: {earliest_start.to_iso8601_string()}")
+    return latest_end, earliest_start
+
+
+def prepare_workspaces():
+    """Load workspace, project/client and relation caches; return the workspace ids or None."""
     # Track API v9 returns all entries for the user
     workspaces = get_workspaces()
     if not workspaces:
         utils.log("No workspaces found or API error.")
-        return
+        return None
     workspace_ids = [ws["id"] for ws in workspaces if ws.get("id") is not None]
+    load_stored_workspace_meta()
     for ws in workspaces:
         load_workspace_cache(ws["id"])
+    notion_helper.preload_relations()
+    reconcile_relations()
+    return workspace_ids
+
+
+def count_toggl_days(coverage, workspace_ids, start_date, end_date, failures=None):
+    """Count Toggl entries per day into coverage; return the Toggl ids seen, or None on failure."""
+    toggl_ids = set()
+    chunk_days = COVERAGE_CHUNK_DAYS
+    current_end = end_date
+    while current_end > start_date:
+        current_start = max(start_date, current_end.subtract(days=chunk_days))
+        chunk_failures = {}
+        counted = 0
+        try:
+            for entry in iter_historical_entries(workspace_ids, current_start, current_end, chunk_failures):
+                counted += 1
+                if entry.id is not None:
+                    toggl_ids.add(entry.id)
+                coverage.add_toggl(pendulum.from_timestamp(entry.start, tz="Asia/Shanghai").date())
+        except TogglAPIError as e:
+            if e.status_code == 402 and not counted and chunk_days > 1:
+                # Narrow the chunk down to where the plan's history limit lies
+                chunk_days = max(1, chunk_days // 2)
+                continue
+            if e.status_code == 402:
+                record_historical_limit(current_start if counted else current_end)
+            utils.log(f"🛑 Could not count Toggl entries for {current_start.to_date_string()} ~ {current_end.to_date_string()}: {e.status_code}")
+            return None
+        if failures is not None:
+            failures.update(chunk_failures)
+        current_end = current_start.subtract(seconds=1)
+    return toggl_ids
+
+
+def count_notion_days(coverage, start_date, end_date):
+    """Count synced Time pages per day into coverage; return {toggl_id: (page_id, day index, stop)}."""
+    pages = {}
+    if state_store:
+        rows = state_store.iter_entries_between(start_date.int_timestamp, end_date.int_timestamp)
+    else:
+        rows = (
+            (toggl_id, page.get("id"), start, stop)
+            for page in notion_helper.iter_time_pages(start_date, end_date)
+            for toggl_id, _, start, stop in [notion_helper.parse_time_page(page)]
+            if toggl_id is not None and start is not None
+        )
+    for toggl_id, page_id, start, stop in rows:
+        index = coverage.add_notion(pendulum.from_timestamp(start, tz="Asia/Shanghai").date())
+        if index is not None:
+            pages[toggl_id] = (page_id, index, stop)
+    return pages
+
+
+def get_running_entry_id():
+    """Id of the entry running right now, or None; raises TogglAPIError when it cannot be read."""
+    response = toggl_client.get("/api/v9/me/time_entries/current")
+    if not response.ok:
+        utils.log(f"Failed to fetch the running time entry: {response.status_code} {response.text}")
+        raise TogglAPIError(response.status_code, response.text)
+    entry = toggl_client.json(response)
+    return entry.get("id") if entry else None
+
+
+def archive_stale_pages(coverage, pages, toggl_ids, mismatched):
+    """Archive pages on mismatched days whose entry is gone from Toggl, except the running entry and today's."""
+    # The Reports API omits the running entry, and its page has an end time
+    # (written as "now") unless the state store recorded it as running
+    try:
+        running_id = get_running_entry_id()
+    except TogglAPIError:
+        utils.log("⚠️ Could not read the running entry; stale pages will not be archived this run.")
+        return
+    mismatched = set(mismatched)
+    today = coverage.offset(pendulum.now("Asia/Shanghai").date())
+    for toggl_id, (page_id, index, stop) in pages.items():
+        if toggl_id == running_id or stop is None or index == today:
+            continue
+        if index in mismatched and toggl_id not in toggl_ids:
+            archive_entry(toggl_id, page_id, f"#{toggl_id} {coverage.day(index).to_date_string()}")
+
+
+def repair_history(progress=None):
+    """Compare per-day entry counts of Toggl and Notion and resync only the days that differ."""
+    for key in sync_stats:
+        sync_stats[key] = 0
+    workspace_ids = prepare_workspaces()
+    if workspace_ids is None:
+        return False
+
+    now = pendulum.now("Asia/Shanghai")
+    start_date = get_created_at().in_timezone("Asia/Shanghai").start_of("day")
+    historical_floor = get_historical_floor()
+    if historical_floor and historical_floor > start_date:
+        start_date = historical_floor.start_of("day")
+    coverage = DayCoverage(start_date.date(), now.date())
+
+    utils.log(f"🧮 Counting entries per day from {start_date.to_date_string()} to {now.to_date_string()}...")
+    failures = {}
+    toggl_ids = count_toggl_days(coverage, workspace_ids, start_date, now, failures)
+    if toggl_ids is None:
+        return False
+    if failures:
+        utils.log(f"⚠️ Could not count {len(failures)} workspaces; stale pages will not be archived this run.")
+    pages = count_notion_days(coverage, start_date, now)
+
+    mismatched = coverage.mismatched_days()
+    utils.log(f"🧮 {len(mismatched)} of {coverage.size} days differ between Toggl and Notion.")
+    if not mismatched:
+        return True
+
+    for first_day, last_day in coverage.mismatched_ranges(max_gap=COVERAGE_MERGE_GAP_DAYS):
+        range_start = pendulum.datetime(first_day.year, first_day.month, first_day.day, tz="Asia/Shanghai")
+        range_end = pendulum.datetime(last_day.year, last_day.month, last_day.day, tz="Asia/Shanghai").end_of("day")
+        utils.log(f"🩹 Repairing {first_day.to_date_string()} ~ {last_day.to_date_string()}")
+        if not sync_data_range(range_start, range_end, workspace_ids, force_reports_api=True, progress=progress):
+            utils.log("⚠️ Repair stopped early due to run budget, API limit or error.")
+            return False
+
+    # Pages left on a mismatched day whose entry is gone from Toggl are stale
+    if not failures:
+        archive_stale_pages(coverage, pages, toggl_ids, mismatched)
+    log_sync_stats()
+    return True
+
+
+def insert_to_notion(progress=None):
+    now = pendulum.now("Asia/Shanghai")
+    for key in sync_stats:
+        sync_stats[key] = 0
+    
+    if state_store and not state_store.is_empty():
+        latest_end, earliest_start = get_state_anchors()
+    else:
+        latest_end, earliest_start = get_notion_anchors()
+
+    workspace_ids = prepare_workspaces()
+    if workspace_ids is None:
+        return
 
     # 3. Strategy Execution
     account_created_at = get_created_at().in_timezone("Asia/Shanghai")
     gap_threshold_days = 7
     
     # Phase A: Incremental Forward Sync (Latest -> Now)
-    # Ensure we cover at least the last 24h even if latest_end is very recent
-    if latest_end:
+    # With a recent change-feed cursor only entries modified since the last
+    # run are fetched; otherwise fall back to re-scanning the recent window.
+    # Leave a minute of overlap so edits made during this run are not missed.
+    next_since = now.subtract(minutes=1).int_timestamp
+    since = state_store.get_cursor("since") if state_store else None
+    if latest_end and since and (now.int_timestamp - int(since)) < CHANGE_FEED_MAX_AGE_DAYS * 86400:
+        if sync_changes(int(since), progress=progress):
+            state_store.set_cursor("since", next_since)
+            state_store.set_cursor("forward", now.to_iso8601_string())
+    elif latest_end:
+        # Ensure we cover at least the last 24h even if latest_end is very recent
         incremental_start = latest_end.subtract(days=1) 
         utils.log(f"🔄 Starting Incremental Sync from: {incremental_start.to_datetime_string()}")
-        sync_data_range(incremental_start, now, workspace_ids, progress=progress)
+        if sync_data_range(incremental_start, now, workspace_ids, progress=progress) and state_store:
+            state_store.set_cursor("forward", now.to_iso8601_string())
+            state_store.set_cursor("since", next_since)
     else:
         # Notion is empty, full sync will handle it
         incremental_start = account_created_at
         utils.log(f"🚀 Notion is empty. Starting initial full import.")
-        sync_data_range(incremental_start, now, workspace_ids, progress=progress)
+        if state_store:
+            # Journal the import so an interrupted run resumes as a backfill from here
+            state_store.set_cursor("backfill_upper", now.to_iso8601_string())
+        if sync_data_range(incremental_start, now, workspace_ids, progress=progress, journal="history") and state_store:
+            state_store.set_cursor("forward", now.to_iso8601_string())
+            state_store.set_cursor("backward", account_created_at.to_iso8601_string())
+            state_store.set_cursor("since", next_since)
+        log_sync_stats()
         return # Initial sync done
 
+    # Reverse sync comes before backfill: it is cheap (queries Notion for
+    # missing IDs) and user-facing, while backfill can resume next run.
+    if run_budget.exhausted():
+        utils.log(f"⏱️ Run budget reached ({run_budget.describe()}); skipping reverse sync and backfill.")
+        log_sync_stats()
+        return
+    reverse_sync_notion_to_toggl()
+    if run_budget.exhausted():
+        utils.log(f"⏱️ Run budget reached ({run_budget.describe()}); skipping backfill.")
+        log_sync_stats()
+        return
+
     # Phase B: Historical Backfill (Gap Fill: Account Created -> Earliest Entry)
-    if earliest_start and (earliest_start - account_created_at).days > gap_threshold_days:
-        utils.log(f"⚠️ Missing history detected! Gap between registration ({account_created_at.to_date_string()}) and earliest entry ({earliest_start.to_date_string()}).")
+    backfill_lower = account_created_at
+    historical_floor = get_historical_floor()
+    if historical_floor and historical_floor > backfill_lower:
+        utils.log(f"ℹ️ Reports API history is known to stop at {historical_floor.to_date_string()}; not probing older data.")
+        backfill_lower = historical_floor
+
+    # We stop at earliest_start because we assume data from there onwards exists.
+    # With a journal the first upper bound is kept, so windows left half-written
+    # by an interrupted run are redone while completed ones are skipped.
+    backfill_upper = earliest_start.subtract(seconds=1) if earliest_start else None
+    resume_at = backfill_upper
+    if state_store and backfill_upper:
+        stored_upper = state_store.get_cursor("backfill_upper")
+        if stored_upper:
+            backfill_upper = pendulum.parse(stored_upper).in_timezone("Asia/Shanghai")
+        else:
+            state_store.set_cursor("backfill_upper", backfill_upper.to_iso8601_string())
+        resume_at = pendulum.from_timestamp(
+            state_store.resume_point("history", backfill_upper.int_timestamp), tz="Asia/Shanghai"
+        )
+
+    if resume_at and (resume_at - backfill_lower).days > gap_threshold_days:
+        utils.log(f"⚠️ Missing history detected! Gap between registration ({backfill_lower.to_date_string()}) and earliest entry ({resume_at.to_date_string()}).")
         utils.log(f"🚀 Triggering GAP BACKFILL (Reports API).")
         
         # Sync from Created At -> Earliest Start
-        # We stop at earliest_start because we assume data from there onwards exists
         sync_success = sync_data_range(
-            account_created_at,
-            earliest_start.subtract(seconds=1),
+            backfill_lower,
+            backfill_upper,
             workspace_ids,
             force_reports_api=True,
             progress=progress,
+            journal="history",
         )
         
         if not sync_success:
-            utils.log("⚠️ Backfill stopped early due to API limit or error.")
+            utils.log("⚠️ Backfill stopped early due to run budget, API limit or error.")
+        elif state_store:
+            state_store.set_cursor("backward", backfill_lower.to_iso8601_string())
             
     else:
         utils.log(f"✅ History continuity checked. No significant gaps found.")
     
-    # After forward sync, perform reverse sync for entries created in Notion
-    # Note: Reverse sync is relatively cheap (queries Notion for missing IDs)
-    reverse_sync_notion_to_toggl()
+    log_sync_stats()
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sync Toggl time entries to Notion")
+    parser.add_argument(
+        "--rebuild-state",
+        action="store_true",
+        help="repopulate the local state store from Notion before syncing",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="compare per-day entry counts with Toggl and resync only the days that differ",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=float(os.getenv("TOGGL_MAX_SECONDS")) if os.getenv("TOGGL_MAX_SECONDS") else None,
+        help="wall-clock budget; stop cleanly before it runs out (defaults to TOGGL_MAX_SECONDS)",
+    )
+    parser.add_argument(
+        "--max-api-calls",
+        type=int,
+        default=int(os.getenv("TOGGL_MAX_API_CALLS")) if os.getenv("TOGGL_MAX_API_CALLS") else None,
+        help="stop after this many Toggl + Notion API calls (defaults to TOGGL_MAX_API_CALLS)",
+    )
+    parser.add_argument(
+        "--state-db",
+        default=None,
+        help="path of the local SQLite state store (defaults to TOGGL_STATE_DB)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global run_budget
+    args = parse_args(argv)
+    state_path = args.state_db or os.getenv("TOGGL_STATE_DB")
+    if args.rebuild_state and not state_path:
+        state_path = DEFAULT_STATE_PATH
+    # Start the clock before init so Notion discovery counts against the budget
+    run_budget = RunBudget(max_seconds=args.max_seconds, max_calls=args.max_api_calls)
     with sync_notification("Toggl") as notification:
-        if init():
+        if init(state_path):
+            run_budget.governors = [toggl_client.governor, notion_helper.rate_governor]
+            load_state(rebuild=args.rebuild_state)
             progress = notification.progress("同步", batch_size=10)
-            insert_to_notion(progress=progress)
+            if args.repair:
+                repair_history(progress=progress)
+            else:
+                insert_to_notion(progress=progress)
+            # Anything still buffered (e.g. after a budget stop) is written now
+            notion_helper.flush_writes()
             progress.flush()
-            notification.set_summary("Toggl 数据同步完成")
+            wait = toggl_client.governor.total_wait + notion_helper.rate_governor.total_wait
+            if run_budget.limited and run_budget.exhausted():
+                notification.set_summary(f"Toggl 数据部分同步，预算已用完，下次运行继续（{run_budget.describe()}）")
+            else:
+                notification.set_summary(f"Toggl 数据同步完成（限流等待 {wait:.0f} 秒）")
 
 
 if __name__ == "__main__":
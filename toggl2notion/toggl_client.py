@@ -0,0 +1,123 @@
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.exceptions import NewConnectionError
+
+from .rate_limit import RateGovernor, parse_retry_after
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, see the "fast" extra in setup.py
+    orjson = None
+
+API_BASE_URL = "https://api.track.toggl.com"
+
+
+class TogglAPIError(Exception):
+    """A Toggl request failed; status_code mirrors the HTTP status (500 for transport errors)."""
+
+    def __init__(self, status_code, message=""):
+        super().__init__(f"{status_code} {message}".strip())
+        self.status_code = status_code
+
+
+class TogglClient:
+    """Keep-alive Toggl API client shared by every call in a run.
+
+    base_url defaults to TOGGL_API_BASE_URL (or the public API) so tests can
+    point the whole sync at a local stand-in server. Every request goes
+    through the client's RateGovernor, which paces calls and retries 429s
+    and transient 5xx responses. Non-idempotent methods (POST, PATCH) are
+    only retried when the request cannot have reached Toggl: a 429 or a
+    failure to connect. Anything else could duplicate a create, so
+    read-only POSTs pass idempotent=True to get the full retry policy.
+    """
+
+    NON_IDEMPOTENT_METHODS = ("POST", "PATCH")
+
+    def __init__(self, token, base_url=None, pool_size=10, timeout=15):
+        self.base_url = (base_url or os.getenv("TOGGL_API_BASE_URL") or API_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        # Toggl documents a ~1 req/s leaky bucket; never pace faster than that
+        self.governor = RateGovernor("Toggl", rate=1.0, min_rate=0.2, max_rate=1.0)
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(f"{token}", "api_token")
+        self.session.headers.update(
+            {
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip, deflate",
+                "User-Agent": "toggl2notion",
+            }
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, idempotent=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        url = self.url(path)
+        if idempotent is None:
+            idempotent = method.upper() not in self.NON_IDEMPOTENT_METHODS
+        classify = self.classify if idempotent else self.classify_non_idempotent
+        response = self.governor.call(
+            lambda: self.session.request(method, url, **kwargs), classify
+        )
+        self.respect_quota(response)
+        return response
+
+    def classify(self, outcome):
+        if isinstance(outcome, (requests.ConnectionError, requests.Timeout)):
+            return True, None
+        if isinstance(outcome, Exception):
+            return False, None
+        if outcome.status_code in RateGovernor.RETRY_STATUSES:
+            return True, parse_retry_after(outcome.headers)
+        return False, None
+
+    def classify_non_idempotent(self, outcome):
+        if isinstance(outcome, Exception):
+            return self.connect_failed(outcome), None
+        if outcome.status_code == 429:
+            return True, parse_retry_after(outcome.headers)
+        return False, None
+
+    @staticmethod
+    def connect_failed(error):
+        """True when the request failed before anything was sent to the server."""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if not isinstance(error, requests.ConnectionError) or not error.args:
+            return False
+        reason = getattr(error.args[0], "reason", None)
+        return isinstance(reason, NewConnectionError)
+
+    def respect_quota(self, response):
+        """Pause before the next call when Toggl reports the hourly quota is spent."""
+        remaining = response.headers.get("X-Toggl-Quota-Remaining")
+        if remaining is None or not remaining.strip().isdigit() or int(remaining) > 0:
+            return
+        resets_in = parse_retry_after(response.headers)
+        if resets_in is not None and resets_in <= self.governor.max_delay:
+            self.governor.sleep(resets_in)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, idempotent=False, **kwargs):
+        return self.request("POST", path, idempotent=idempotent, **kwargs)
+
+    @staticmethod
+    def json(response):
+        if orjson is not None:
+            return orjson.loads(response.content)
+        return response.json()
+
+    def close(self):
+        self.session.close()
@@ -2,9 +2,6 @@ import os
 import time
 from urllib.parse import urlencode
 
-from .notion_helper import NotionHelper
-from .utils import log
-
 
 def normalize_optional_value(value):
     normalized = str(value or "").strip()
@@ -29,14 +26,32 @@ def build_heatmap_url():
 
 
 def main():
-    notion_helper = NotionHelper()
+    # Imported here so the console script does not load the sync stack
+    from notion_client import Client
+    from notionhub.log import log
+
+    from .discovery import DiscoveryCache
+    from .heatmap import resolve_heatmap_block_id, update_heatmap_block
+
+    client = Client(auth=os.getenv("NOTION_TOKEN"))
+    cache = DiscoveryCache()
     url = build_heatmap_url()
-    if not notion_helper.heatmap_block_id:
+    block_id = resolve_heatmap_block_id(client, cache)
+    if not block_id:
         log("跳过 Toggl 热力图更新: 未找到 heatmap block id")
         return
-    notion_helper.update_heatmap(block_id=notion_helper.heatmap_block_id, url=url)
+    try:
+        update_heatmap_block(client, block_id, url)
+    except Exception as e:
+        if getattr(e, "code", None) != "object_not_found" or os.getenv("HEATMAP_BLOCK_ID"):
+            raise
+        # The cached block is gone; look it up again once
+        block_id = resolve_heatmap_block_id(client, cache, refresh=True)
+        if not block_id:
+            log("跳过 Toggl 热力图更新: 未找到 heatmap block id")
+            return
+        update_heatmap_block(client, block_id, url)
     log(f"更新 Toggl 热力图成功，热力图链接：{url}")
 
-
 if __name__ == "__main__":
     main()
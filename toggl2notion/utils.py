@@ -51,13 +51,38 @@ from notionhub.log import log, timeit
 # --- Script-specific functions ---
 
 
+# Code points that extend the previous character within one emoji grapheme cluster
+EMOJI_MODIFIERS = {0xFE0E, 0xFE0F, 0x20E3}
+ZERO_WIDTH_JOINER = 0x200D
+
+
+def leading_grapheme(s):
+    """Return the first grapheme cluster of s, as far as emoji sequences are concerned."""
+    end = 1
+    first = ord(s[0])
+    # Flags are a pair of regional indicators
+    if 0x1F1E6 <= first <= 0x1F1FF and len(s) > 1 and 0x1F1E6 <= ord(s[1]) <= 0x1F1FF:
+        end = 2
+    while end < len(s):
+        cp = ord(s[end])
+        if cp in EMOJI_MODIFIERS or 0x1F3FB <= cp <= 0x1F3FF or 0xE0020 <= cp <= 0xE007F:
+            end += 1
+        elif cp == ZERO_WIDTH_JOINER and end + 1 < len(s):
+            end += 2
+        else:
+            break
+    return s[:end]
+
+
 def split_emoji_from_string(s):
-    # 检查第一个字符是否是emoji
-    l = list(filter(lambda x: x.get("match_start") == 0, emoji.emoji_list(s)))
-    if len(l) > 0:
-        return l[0].get("emoji"), s[l[0].get("match_end"):]
-    else:
+    # 只检查开头的字形簇，不扫描整个字符串
+    if not s or (s[0] < "\x80" and s[0] not in "#*0123456789"):
         return '⏰', s
+    cluster = leading_grapheme(s)
+    for end in range(len(cluster), 0, -1):
+        if emoji.is_emoji(cluster[:end]):
+            return cluster[:end], s[end:]
+    return '⏰', s
 
 
 upload_url = "https://toggl.notionhub.app/upload-svg"